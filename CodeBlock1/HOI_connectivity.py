@@ -23,16 +23,20 @@ Created on Wed Apr 13 09:04:21 2022
 
 import os
 import numpy as np
+from contextlib import contextmanager
+from multiprocessing import get_context, shared_memory
+from concurrent.futures import ProcessPoolExecutor
 #setting the current working directory
 #os.chdir('/Users/boltzmann/Dropbox/VUmc/Topology_Behavior/Backup_Pierre')
 #os.getcwd()
 import glob
 import cmath
 from scipy.stats import norm
-from itertools import combinations
 from scipy.special import digamma
+from functools import lru_cache
 #importing Pierres Code - infotopo
 import infotopo_server as infotopo
+from nplet_index import nplet_count, nplet_block, unrank_nplets
 import pandas as pd
 
 ############
@@ -121,30 +125,69 @@ def gaussian_ent_biascorr(N,T):
 	return 0.5 * ((N * np.log(2/(T-1))) + np.sum(list(map(lambda n : digamma((T-n)/2), values))) )
 
 
+@lru_cache(maxsize = None)
+def gaussian_ppf_table(T):
+
+	"""
+	
+	Without ties the ranks of every column are a permutation of 1..T, so the gaussian copula values
+	are always the same T numbers. They are computed once per sample size T and cached (read-only).
+	
+	"""
+	
+	table = norm.ppf(np.arange(1, T+1) / (T+1), 0, 1) # PPF : Probability Density Function  => Gaussian data
+	table[~np.isfinite(table)] = 0 # Removing -Inf
+    #ask if this removal is correct or something like that
+	table.flags.writeable = False
+	
+	return table
+
+
+@lru_cache(maxsize = None)
+def gaussian_biascorr_table(N, T):
+
+	"""
+	
+	INPUTS:
+	
+	N = Maximum number of dimensions
+	T = Sample size
+	
+	OUTPUTS
+	
+	biascorr = read-only array with biascorr[k] = gaussian_ent_biascorr(k, T) for k = 0..N,
+	computed once per (N, T) and applied as vector constants to the batched entropies.
+	"""
+	
+	digammas = np.concatenate(([0], np.cumsum(digamma((T - np.arange(1, N+1))/2))))
+	biascorr = 0.5 * ((np.arange(N+1) * np.log(2/(T-1))) + digammas)
+	biascorr.flags.writeable = False
+	
+	return biascorr
+
+
 def data2gaussian (data) :
 
 	"""
 	
 	INPUTS :
 	
-	data = T samples x N variables matrix
+	data = T samples x N variables matrix, or a cohort tensor S subjects x T samples x N variables
 	
 	OUTPUTS :
 	
-	gaussian_data = T samples x N variables matrix with the gaussian copula transformed data.
-	covmat = N x N covariance matrix of gaussian copula transformed data.
+	gaussian_data = T samples x N variables matrix (S x T x N for a cohort) with the gaussian copula transformed data.
+	covmat = N x N covariance matrix (S x N x N for a cohort) of gaussian copula transformed data.
 	
 	"""
 	
-	T = len(data)
-	sort_index = np.argsort(data, axis = 0) # Sort the data and keep the indexes.
-	copdata = np.argsort(sort_index, axis = 0) # Sorting sorting indexes
-	copdata += 1 # To avoid 0 because of the python indexation
-	copdata = copdata/ (T+1) # Normalization.
-	gaussian_data = norm.ppf(copdata, 0, 1) # PPF : Probability Density Function  => Gaussian data
-	gaussian_data[~np.isfinite(gaussian_data)] = 0 # Removing -Inf
-    #ask if this removal is correct or something like that
-	cov_mat = np.dot(np.transpose(gaussian_data), gaussian_data ) / (T-1) # Covariance matrix
+	data = np.asarray(data)
+	T = data.shape[-2]
+	sort_index = np.argsort(data, axis = -2) # Sort the data and keep the indexes.
+	copdata = np.empty(sort_index.shape, dtype = np.intp)
+	np.put_along_axis(copdata, sort_index, np.arange(T).reshape(-1, 1), axis = -2) # Ranks (0..T-1), scattered instead of a second argsort
+	gaussian_data = gaussian_ppf_table(T)[copdata] # Gaussian value of the rank (rank+1)/(T+1)
+	cov_mat = np.swapaxes(gaussian_data, -1, -2) @ gaussian_data / (T-1) # Covariance matrix
 	
 	return gaussian_data, cov_mat
 
@@ -197,9 +240,10 @@ def soinfo_from_covmat (covmat, T):
 	
 	### Bias corrector for N, (N-1) and one gaussian variables :
 	
-	biascorrN = gaussian_ent_biascorr(N, T)
-	biascorrNmin1 = gaussian_ent_biascorr(N-1, T)
-	biascorr_1 = gaussian_ent_biascorr(1, T)
+	biascorr = gaussian_biascorr_table(N, T)
+	biascorrN = biascorr[N]
+	biascorrNmin1 = biascorr[N-1]
+	biascorr_1 = biascorr[1]
 	
 	### Computing estimated measures for multi-variate gaussian variables :
 	
@@ -214,12 +258,348 @@ def soinfo_from_covmat (covmat, T):
 
 	oinfo = tc - dtc
 	sinfo = tc + dtc
-	
+
 	return oinfo, sinfo
 
 
+##################################
+#PART2.2 Closed-form triplet path#
+##################################
+
+#For n = 3 every determinant needed by soinfo_from_covmat has a closed form, so all the triplets
+#can be computed at once on NumPy index arrays instead of one Python call per triplet.
+
+def ent_fun_log(n, logdet):
+
+    """
+    Vectorized version of ent_fun, taking the log-determinant instead of the determinant.
+    A NaN log-determinant (non-positive determinant) gives a NaN entropy.
+    """
+
+    return 0.5 * (n * np.log(2 * np.pi * np.e) + logdet)
+
+
+def _logdet(det):
+
+    return np.log(np.where(det > 0, det, np.nan)) # Non-positive determinants are set to NaN
+
+
+def soinfo_triplets_from_covmat(covmat, T, nplets, biascorr = None):
+
+    """
+
+    INPUTS :
+
+    covmat = N x N covariance matrix of the gaussian copula transformed data
+    T = lenght data
+    nplets = M x 3 array with the indexes (i < j < k) of the triplets
+    biascorr = bias corrector table, gaussian_biascorr_table(3, T) by default
+
+    OUTPUTS :
+
+    oinfo = O - Information of the M triplets
+    sinfo = S - Information of the M triplets
+    tc = Total correlation of the M triplets
+    dtc = Dual total correlation of the M triplets
+
+    Triplets with a non-positive determinant are returned as NaN.
+
+    """
+
+    covmat = np.asarray(covmat)
+    nplets = np.asarray(nplets)
+    i, j, k = nplets[:, 0], nplets[:, 1], nplets[:, 2]
+
+    ### Variances and covariances of each triplet :
+
+    a, b, c = covmat[i, i], covmat[j, j], covmat[k, k]
+    x, y, z = covmat[i, j], covmat[i, k], covmat[j, k]
+
+    ### Closed-form 3x3 determinant and the three leave-one-out 2x2 determinants :
+
+    det3 = a*b*c + 2*x*y*z - a*z**2 - b*y**2 - c*x**2
+    det2 = (b*c - z**2, a*c - y**2, a*b - x**2)
+
+    if biascorr is None:
+        biascorr = gaussian_biascorr_table(3, T)
+    biascorrN, biascorrNmin1, biascorr_1 = biascorr[3], biascorr[2], biascorr[1]
+
+    H3 = ent_fun_log(3, _logdet(det3)) - biascorrN
+    H1 = sum(ent_fun_log(1, _logdet(var)) for var in (a, b, c)) - 3 * biascorr_1
+    Hred = sum(ent_fun_log(2, _logdet(det)) for det in det2) - 3 * biascorrNmin1
+
+    tc = H1 - H3 #Total correlation
+    dtc = Hred - 2 * H3 # dtc = Dual Total Correlation
+
+    oinfo = tc - dtc
+    sinfo = tc + dtc
+
+    return oinfo, sinfo, tc, dtc
+
+
+#############################################
+#PART2.3 Batched engine for any n-plet order#
+#############################################
+
+#For n >= 4 the n-plet submatrices are stacked in (M, n, n) blocks and their log-determinants are
+#computed in batch. The n leave-one-out determinants come from the diagonal of the batched inverse,
+#det(C_-i) = det(C) * (C^-1)_ii, instead of n reduce_x deletions.
+
+def soinfo_nplets_from_covmat(covmat, T, nplets, block_size = 20000, biascorr = None):
+
+    """
+
+    INPUTS :
+
+    covmat = N x N covariance matrix of the gaussian copula transformed data
+    T = lenght data
+    nplets = M x n array with the indexes of the n-plets
+    block_size = number of n-plets stacked in each (block_size, n, n) array
+    biascorr = bias corrector table, gaussian_biascorr_table(n, T) by default
+
+    OUTPUTS :
+
+    oinfo = O - Information of the M n-plets
+    sinfo = S - Information of the M n-plets
+    tc = Total correlation of the M n-plets
+    dtc = Dual total correlation of the M n-plets
+
+    N-plets with a non-positive determinant are returned as NaN.
+
+    """
+
+    covmat = np.asarray(covmat)
+    nplets = np.asarray(nplets)
+    M, N = nplets.shape
+
+    if biascorr is None:
+        biascorr = gaussian_biascorr_table(N, T)
+    biascorrN, biascorrNmin1, biascorr_1 = biascorr[N], biascorr[N-1], biascorr[1]
+
+    tc = np.empty(M)
+    dtc = np.empty(M)
+
+    for start in range(0, M, block_size):
+        x = nplets[start:start + block_size]
+        sub = covmat[x[:, :, None], x[:, None, :]] # (block, n, n) submatrices
+
+        sign, logdet = np.linalg.slogdet(sub)
+        singular = sign <= 0
+        logdet[singular] = np.nan
+        sub[singular] = np.eye(N) # Keeps the batched inverse defined, the results stay NaN
+
+        inv_diag = np.diagonal(np.linalg.inv(sub), axis1 = 1, axis2 = 2)
+        logdet_red = logdet[:, None] + _logdet(inv_diag) # Leave-one-out log-determinants
+        single_vars = np.diagonal(sub, axis1 = 1, axis2 = 2)
+
+        HN = ent_fun_log(N, logdet) - biascorrN
+        H1 = np.sum(ent_fun_log(1, _logdet(single_vars)), axis = 1) - N * biascorr_1
+        Hred = np.sum(ent_fun_log(N-1, logdet_red), axis = 1) - N * biascorrNmin1
+
+        tc[start:start + block_size] = H1 - HN
+        dtc[start:start + block_size] = Hred - (N-1) * HN
+
+    oinfo = tc - dtc
+    sinfo = tc + dtc
+
+    return oinfo, sinfo, tc, dtc
+
+
+def soinfo_block(covmat, T, nplets, biascorr = None):
+
+    """
+    Dispatches a block of n-plets to the closed-form triplet kernel (n = 3) or to the batched engine.
+    """
+
+    if np.shape(nplets)[1] == 3:
+        return soinfo_triplets_from_covmat(covmat, T, nplets, biascorr = biascorr)
+
+    return soinfo_nplets_from_covmat(covmat, T, nplets, biascorr = biascorr)
+
+
+def copula_covmat(data):
+
+    """
+
+    INPUTS :
+
+    data = Matrix with dimensionality (N,T), where N is the number of brain regions or
+    modules, and T is the number of samples.
+
+    OUTPUTS :
+
+    cov_mat = N x N covariance matrix of the gaussian copula transformed data.
+    T = number of samples.
+
+    """
+
+    ## DATA NORMALISATION :
+
+    mean = np.mean(data, axis = 1)
+    mean = mean.reshape(-1,1)
+
+    dataNorm = data - mean
+
+    gaussian_data, cov_mat = data2gaussian (np.transpose(dataNorm)) # Transformation to Copulas and Covariance Matrix Estimation
+
+    return cov_mat, len(dataNorm[0])
+
+
+
+def red_syn_sums(nplets, Oinfo, Modules):
+
+    """
+
+    Per-region sums needed for the Redundancy and Synergy, computed in a single pass over the
+    flattened n-plet membership. Sums of consecutive blocks of n-plets can simply be added.
+
+    INPUTS :
+
+    nplets = M x n array with the indexes of the n-plets
+    Oinfo = O-Information of the M n-plets
+    Modules = number of brain regions or modules
+
+    OUTPUTS :
+
+    sums = 4 x Modules array with, per module, the sum of the positive Oinfo values, their number,
+    the sum of the absolute negative Oinfo values and their number.
+
+    """
+
+    nplets = np.asarray(nplets)
+    Oinfo = np.asarray(Oinfo)
+    n = nplets.shape[1]
+    members = nplets.ravel()
+
+    pos = np.repeat(Oinfo > 0, n) # NaN values are neither positive nor negative
+    neg = np.repeat(Oinfo < 0, n)
+    values = np.repeat(np.abs(Oinfo), n)
+
+    return np.stack([np.bincount(members, weights = np.where(pos, values, 0), minlength = Modules),
+                     np.bincount(members, weights = pos, minlength = Modules),
+                     np.bincount(members, weights = np.where(neg, values, 0), minlength = Modules),
+                     np.bincount(members, weights = neg, minlength = Modules)])
+
+
+def red_syn_from_sums(sums):
+
+    """
+    Red = mean positive Oinfo per module, Syn = mean absolute negative Oinfo per module.
+    Modules without positive (negative) n-plets get NaN, as the mean of an empty list.
+    """
+
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        Red = sums[0] / sums[1]
+        Syn = sums[2] / sums[3]
+
+    return Red, Syn
+
+
+
+##########################################
+#PART2.3b Multiprocess O-info computation#
+##########################################
+
+#The n-plet rank space is split in contiguous ranges, one per process. The copula covariance is placed
+#in shared memory instead of being pickled to each worker, and every worker writes its range directly
+#into a preallocated shared output array.
+
+BLAS_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                         'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+@contextmanager
+def pinned_blas_threads(n_threads = 1):
+
+    """
+    Sets the BLAS thread variables while worker processes are started, so that processes and
+    BLAS threads do not oversubscribe the cores. The previous values are restored afterwards.
+    """
+
+    previous = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+    os.environ.update({name: str(n_threads) for name in BLAS_THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _soinfo_shard(cov_name, out_name, Modules, n, T, start, stop, block_size):
+
+    """
+    Worker : computes the n-plets with ranks in [start, stop) and writes Oinfo, Sinfo, TC and DTC
+    in the shared output array.
+    """
+
+    cov_shm = shared_memory.SharedMemory(name = cov_name)
+    out_shm = shared_memory.SharedMemory(name = out_name)
+    cov_mat = np.ndarray((Modules, Modules), dtype = np.float64, buffer = cov_shm.buf)
+    out = np.ndarray((4, nplet_count(Modules, n)), dtype = np.float64, buffer = out_shm.buf)
+    biascorr = gaussian_biascorr_table(n, T)
+
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        nplets = nplet_block(Modules, n, block_start, block_stop)
+        out[:, block_start:block_stop] = soinfo_block(cov_mat, T, nplets, biascorr = biascorr)
+
+    del cov_mat, out # The views must be released before closing the shared memory
+    cov_shm.close()
+    out_shm.close()
+
+
+def soinfo_parallel(covmat, T, n, n_workers = None, block_size = 100000):
+
+    """
+
+    INPUTS :
+
+    covmat = N x N covariance matrix of the gaussian copula transformed data
+    T = lenght data
+    n = number of interactions or n-plets.
+    n_workers = number of processes, os.cpu_count() by default
+    block_size = number of n-plets computed at once by each process
+
+    OUTPUTS :
+
+    oinfo, sinfo, tc, dtc = arrays of length C(N, n) ordered by n-plet rank (see nplet_index).
+
+    """
+
+    covmat = np.ascontiguousarray(covmat, dtype = np.float64)
+    Modules = len(covmat)
+    M = nplet_count(Modules, n)
+    n_workers = n_workers or os.cpu_count()
+
+    cov_shm = shared_memory.SharedMemory(create = True, size = covmat.nbytes)
+    out_shm = shared_memory.SharedMemory(create = True, size = max(4 * M * 8, 1))
+    try:
+        np.ndarray(covmat.shape, dtype = np.float64, buffer = cov_shm.buf)[:] = covmat
+        bounds = np.linspace(0, M, n_workers + 1).astype(np.int64)
+
+        # spawn (not fork) so that the pinned BLAS variables are read when each worker imports numpy
+        with pinned_blas_threads(1):
+            with ProcessPoolExecutor(max_workers = n_workers, mp_context = get_context('spawn')) as executor:
+                futures = [executor.submit(_soinfo_shard, cov_shm.name, out_shm.name, Modules, n, T,
+                                           int(start), int(stop), block_size)
+                           for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+                for future in futures:
+                    future.result()
+
+        out = np.ndarray((4, M), dtype = np.float64, buffer = out_shm.buf).copy()
+    finally:
+        cov_shm.close()
+        cov_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+
+    return out[0], out[1], out[2], out[3]
 
-def high_order (data, n):
+
+
+def high_order (data, n, n_workers = None):
 
     """ 
 
@@ -231,6 +611,7 @@ def high_order (data, n):
     data = Matrix with dimensionality (N,T), where N is the number of brain regions or 
     modules, and T is the number of samples.
     n = number of interactions or n-plets.
+    n_workers = if given, Oinfo and Sinfo are computed by this number of processes (see soinfo_parallel).
     
     OUTPUTS :
     Red = Matrix with dimension (1, Modules), with the redundancy values per patient 
@@ -245,41 +626,27 @@ def high_order (data, n):
     ### INITIALISATION :
     
     Modules = len(data)
-    Red = np.zeros(Modules) 
-    Syn = np.zeros(Modules)
     
-    vector = np.arange(0, Modules)
-    nplets = []
-
-        
     Oinfo = []
     Sinfo = []
 
 
     ### N-PLETS CALCULATION :
     
-    for x in combinations(vector, n): # n-tuples without repetition over 20 modules
-        nplets.append(x)
-    nplets = np.array(nplets)
+    nplets = unrank_nplets(np.arange(nplet_count(Modules, n)), Modules, n) # n-tuples without repetition, in itertools.combinations order
 
     ## DATA NORMALISATION :
 
-    mean = np.mean(data, axis = 1)
-    mean = mean.reshape(-1,1)
-    
-    dataNorm = data - mean
-
-    gaussian_data, cov_mat = data2gaussian (np.transpose(dataNorm)) # Transformation to Copulas and Covariance Matrix Estimation
+    cov_mat, T = copula_covmat(data)
     
     i = 0
     
     ### OINFO AND SINFO COMPUTATION :	
 
-    Info = []
-    Info.append(list(map(lambda x : soinfo_from_covmat(cov_mat[np.ix_(x,x)], len(dataNorm[0])), nplets)))
-    Info = np.transpose(Info)
-    Oinfo = np.array(Info[0])
-    Sinfo = np.array(Info[1])
+    if n_workers:
+        Oinfo, Sinfo, _, _ = soinfo_parallel(cov_mat, T, n, n_workers)
+    else:
+        Oinfo, Sinfo, _, _ = soinfo_block(cov_mat, T, nplets)
     
     ### REDUNDANCY AND SYNERGY COMPUTATION :
     
@@ -287,38 +654,210 @@ def high_order (data, n):
     Here, we want to verify in each nplet if a module exist : when it is the case we compute
     the associated Redundancy and Synergy, according to the Oinfo value of these nplets.
     """
-    Values = []
-    
-    for module in range(Modules):
-        Values, cols = np.where(nplets == module)
-        
-        Oinfo_module_pos = []
-        Oinfo_module_neg = []
-        
-        for i in range(len(Values)):
-
-            if Oinfo[Values[i]].real > 0 :
-                Oinfo_module_pos.append(Oinfo[Values[i]].real)
-            if Oinfo[Values[i]].real < 0 :
-                Oinfo_module_neg.append(Oinfo[Values[i]].real)
-
-        Red[module] = np.mean(np.array(Oinfo_module_pos))
-        Syn[module] = np.mean(np.absolute(np.array(Oinfo_module_neg)))
-        
-        Values = []
-        
-    Red = Red.reshape(-1,1)
-    Syn = Syn.reshape(-1,1)
-    
-    np.nan_to_num(Syn)
-    Red= [value[0] for value in Red]
-    Syn= [value[0] for value in Syn]
-    Oinfo= [np.real(value[0]) for value in Oinfo]
-    Sinfo= [np.real(value[0]) for value in Sinfo]
+
+    Red, Syn = red_syn_from_sums(red_syn_sums(nplets, Oinfo, Modules))
+
+    Red= list(Red)
+    Syn= list(Syn)
+    Oinfo= list(Oinfo)
+    Sinfo= list(Sinfo)
     
 
     return Red, Syn, Oinfo, Sinfo, nplets
 
+
+###########################
+#PART2.4 Streaming n-plets#
+###########################
+
+#For large atlases (e.g. Schaefer1000, ~174M triplets) the n-plets cannot be held in memory at once.
+#The combination space is walked in fixed-size blocks, so the peak memory depends on block_size only.
+
+def iter_nplet_blocks(Modules, n, block_size = 100000):
+
+    """
+    Yields the n-plets of range(Modules), in the same order as itertools.combinations,
+    as (block_size, n) integer arrays (the last block may be shorter).
+    Block b holds the n-plets with ranks [b*block_size, (b+1)*block_size), see nplet_index.
+    """
+
+    total = nplet_count(Modules, n)
+
+    for start in range(0, total, block_size):
+        yield nplet_block(Modules, n, start, min(start + block_size, total))
+
+
+def high_order_stream(data, n, block_size = 100000):
+
+    """
+
+    Streaming version of high_order.
+
+    INPUTS :
+
+    data = Matrix with dimensionality (N,T), where N is the number of brain regions or
+    modules, and T is the number of samples.
+    n = number of interactions or n-plets.
+    block_size = number of n-plets computed at once.
+
+    OUTPUTS :
+
+    Generator yielding, for each block, the tuple (nplets, Oinfo, Sinfo, TC, DTC) where
+    nplets is a (block_size, n) array and the other entries are arrays of length block_size.
+
+    """
+
+    cov_mat, T = copula_covmat(data)
+    biascorr = gaussian_biascorr_table(n, T)
+
+    for nplets in iter_nplet_blocks(len(cov_mat), n, block_size):
+        yield (nplets,) + tuple(soinfo_block(cov_mat, T, nplets, biascorr = biascorr))
+
+
+#########################################
+#PART2.5 Top-k selection while streaming#
+#########################################
+
+#Downstream only the most redundant / synergistic n-plets are used (e.g. the top 0.5% in surrogate_analysis).
+#Instead of storing and sorting all the values, each block is merged with the current best candidates
+#using np.argpartition, so the memory is O(k) plus one block.
+
+def _merge_topk(values, ranks, new_values, new_ranks, k, largest):
+
+    values = np.concatenate((values, new_values))
+    ranks = np.concatenate((ranks, new_ranks))
+    keep = ~np.isnan(values)
+    values, ranks = values[keep], ranks[keep]
+
+    if k == 0:
+        return values[:0], ranks[:0]
+    if len(values) > k:
+        best = np.argpartition(-values if largest else values, k - 1)[:k]
+        values, ranks = values[best], ranks[best]
+
+    return values, ranks
+
+
+def high_order_topk(data, n, k = None, fraction = 0.005, metrics = ('Oinfo',), block_size = 100000):
+
+    """
+
+    INPUTS :
+
+    data = Matrix with dimensionality (N,T), where N is the number of brain regions or
+    modules, and T is the number of samples.
+    n = number of interactions or n-plets.
+    k = number of n-plets to keep on each side. By default int(C(N, n) * fraction), as in surrogate_analysis.
+    metrics = metrics to rank, among 'Oinfo', 'Sinfo', 'TC' and 'DTC'.
+    block_size = number of n-plets computed at once.
+
+    OUTPUTS :
+
+    topk = dictionary metric -> (redundant, synergistic), two DataFrames with the k n-plets with the
+    largest and the smallest values of the metric (sorted), with columns [metric, 'rank', 'nplets'].
+
+    """
+
+    names = ('Oinfo', 'Sinfo', 'TC', 'DTC')
+    Modules = len(data)
+    if k is None:
+        k = int(nplet_count(Modules, n) * fraction)
+
+    empty = (np.empty(0), np.empty(0, dtype = np.int64))
+    best = {(metric, largest): empty for metric in metrics for largest in (True, False)}
+
+    rank = 0
+    for block in high_order_stream(data, n, block_size):
+        nplets, values = block[0], dict(zip(names, block[1:]))
+        ranks = np.arange(rank, rank + len(nplets))
+        for (metric, largest), (top_values, top_ranks) in best.items():
+            best[(metric, largest)] = _merge_topk(top_values, top_ranks, values[metric], ranks, k, largest)
+        rank += len(nplets)
+
+    topk = {}
+    for metric in metrics:
+        sides = []
+        for largest in (True, False):
+            top_values, top_ranks = best[(metric, largest)]
+            order = np.argsort(-top_values if largest else top_values, kind = 'stable')
+            top_ranks = top_ranks[order]
+            sides.append(pd.DataFrame({metric: top_values[order], 'rank': top_ranks,
+                                       'nplets': list(map(tuple, unrank_nplets(top_ranks, Modules, n).tolist()))}))
+        topk[metric] = tuple(sides)
+
+    return topk
+
+#############################################
+#PART2.6 Sliding-window time-resolved O-info#
+#############################################
+
+#The gaussian copula is computed once over the whole session. The covariance of each window is then
+#updated by adding the outer products of the samples entering the window and removing those leaving it,
+#instead of recomputing the copula and the covariance of every window from scratch.
+
+def high_order_windows(data, n, window, step = 1, path = 'high_order_windows.npy', metric = 'Oinfo',
+                       dtype = np.float32, block_size = 100000, refresh = 1000):
+
+    """
+
+    INPUTS :
+
+    data = Matrix with dimensionality (N,T), where N is the number of brain regions or
+    modules, and T is the number of samples.
+    n = number of interactions or n-plets.
+    window = number of samples in each window.
+    step = number of samples between the starts of two consecutive windows.
+    path = .npy file where the results are memory-mapped.
+    metric = one of 'Oinfo', 'Sinfo', 'TC' and 'DTC'.
+    dtype = dtype of the stored values.
+    block_size = number of n-plets computed at once.
+    refresh = the window scatter matrix and column sums are recomputed exactly every refresh windows,
+    to avoid the accumulation of rounding errors of the incremental updates.
+
+    OUTPUTS :
+
+    out = memory-mapped array (windows x n-plets) with the metric of each n-plet (ordered by rank,
+    see nplet_index) in each window. It can be reopened later with np.load(path, mmap_mode = 'r').
+
+    """
+
+    column = ('Oinfo', 'Sinfo', 'TC', 'DTC').index(metric)
+
+    mean = np.mean(data, axis = 1)
+    dataNorm = data - mean.reshape(-1,1)
+    gaussian_data, _ = data2gaussian(np.transpose(dataNorm)) # T x N, copula of the whole session
+
+    T, Modules = gaussian_data.shape
+    if not 1 < window <= T:
+        raise ValueError("window must be in [2, T] (T = %i samples), got %i" % (T, window))
+    n_windows = (T - window) // step + 1
+    out = np.lib.format.open_memmap(path, mode = 'w+', dtype = dtype, shape = (n_windows, nplet_count(Modules, n)))
+    biascorr = gaussian_biascorr_table(n, window)
+
+    for w in range(n_windows):
+        start = w * step
+        if w % refresh == 0 or step >= window:
+            scatter = gaussian_data[start:start + window].T @ gaussian_data[start:start + window]
+            sums = gaussian_data[start:start + window].sum(axis = 0)
+        else:
+            entering = gaussian_data[start - step + window:start + window]
+            leaving = gaussian_data[start - step:start]
+            scatter += entering.T @ entering - leaving.T @ leaving # Rank-step update of the window
+            sums += entering.sum(axis = 0) - leaving.sum(axis = 0)
+        # the copula is centered over the whole session only: center the window covariance
+        cov_mat = (scatter - np.outer(sums, sums) / window) / (window - 1)
+
+        rank = 0
+        for nplets in iter_nplet_blocks(Modules, n, block_size):
+            out[w, rank:rank + len(nplets)] = soinfo_block(cov_mat, window, nplets, biascorr = biascorr)[column]
+            rank += len(nplets)
+
+    out.flush()
+
+    return out
+
+
+
 def run_High_Order(N,df,save=False):
     "This code computes Oinfo, Sinfo for an individual in Cohort"
     #for individual in Cohort:
@@ -331,12 +870,33 @@ def run_High_Order(N,df,save=False):
     ROIs=list(range(0,atlas_size))
     
     High_order = pd.DataFrame(list(zip(Oinfo, Sinfo, nplets)),columns=['Oinfo','Sinfo','nplets'])
+    High_order['rank'] = np.arange(len(nplets)) # combinadic rank of each n-plet, see nplet_index
 
     #pd.DataFrame(High_order).to_csv('High_order_3/Red_Syn_3_'+files[i][-10:],index=False, sep=' ', na_rep = 'NaN',header=None)
     #i+=1
     return High_order
 
 
+def run_High_Order_stream(N, df, path, block_size = 100000):
+    "This code computes Oinfo, Sinfo for an individual and writes them block by block to a csv file"
+    "The n-plets are stored by their combinadic rank, see nplet_index.unrank_nplets"
+    "Red and Syn per region are accumulated block by block and returned"
+    n = N
+    temp=np.transpose(df).values
+    print("Experiment :")
+    print("Data shape : ", np.shape(temp))
+    print("N-plet : N = ", n)
+    rank = 0
+    sums = np.zeros((4, len(temp)))
+    for nplets, Oinfo, Sinfo, _, _ in high_order_stream(temp, n, block_size):
+        High_order = pd.DataFrame({'Oinfo': Oinfo, 'Sinfo': Sinfo, 'rank': np.arange(rank, rank + len(nplets))})
+        High_order.to_csv(path, mode = 'w' if rank == 0 else 'a', header = rank == 0, index = False)
+        sums += red_syn_sums(nplets, Oinfo, len(temp))
+        rank += len(nplets)
+    Red, Syn = red_syn_from_sums(sums)
+    return path, Red, Syn
+
+
 def info_topo(df):
     Data = df.dropna().to_numpy()#pd.read_csv('AAL_timeseries_100307.txt', sep ='\t',header=None).dropna().to_numpy()
 
@@ -346,41 +906,18 @@ def info_topo(df):
 # Joint entropies
 # Interaction, mutual and total correlation
     Nentropie = information_topo.simplicial_entropies_decomposition(Data)
-
-
-
-
-#Geting the indexes
-    indexes=list(Nentropie.keys())
-    idx=[list(i) for i in indexes]
-#getting the values for joint distribution
-    values_joint=list(Nentropie.values())
-#creating the tuples for Joint entropy
-    data_tuples_Joint_S = list(zip(values_joint,idx))
-#Separating it according to the size
-    Joint_S=pd.DataFrame(data_tuples_Joint_S,columns=['values','index'])
-    Joint_S_1= Joint_S[Joint_S['index'].str.len()==1]
-    Joint_S_2= Joint_S[Joint_S['index'].str.len()==2]
-    Joint_S_3= Joint_S[Joint_S['index'].str.len()==3]
-#Same for Mutual Information
+#Same for Mutual Information and Total Correlation
     Ninfomut = information_topo.simplicial_infomut_decomposition(Nentropie)
-    values_mut=list(Ninfomut.values())
-    data_tuples_Mut_S = list(zip(values_mut,idx))
-    Mut_S=pd.DataFrame(data_tuples_Mut_S,columns=['values','index'])
-    Mut_S_1= Mut_S[Mut_S['index'].str.len()==1]
-    Mut_S_2= Mut_S[Mut_S['index'].str.len()==2]
-    Mut_S_3= Mut_S[Mut_S['index'].str.len()==3]
-#Same for Total Correlation
     TC=information_topo.total_correlation_simplicial_lanscape(Nentropie)
-    values_TC=list(TC.values())
-    data_tuples_TC = list(zip(values_TC,idx))
-    TC_S=pd.DataFrame(data_tuples_TC,columns=['values','index'])
-    TC_S_1= TC_S[TC_S['index'].str.len()==1]
-    TC_S_2= TC_S[TC_S['index'].str.len()==2]
-    TC_S_3= TC_S[TC_S['index'].str.len()==3]
-
-    test=pd.concat([Joint_S_3['values'], Mut_S_3['values'],TC_S_3], axis=1, join="inner")
-    test.columns=['Joint Ent','Mut Info','Total Corr','nplets']
+
+#The lattices store one array per order (indexed by the rank of the n-plet), so the triplets are read directly
+#The row index is still the position of the triplet in the whole lattice (after the singletons and the pairs)
+    start = nplet_count(atlas_size, 1) + nplet_count(atlas_size, 2)
+    test=pd.DataFrame({'Joint Ent': Nentropie.values_at(3),
+                       'Mut Info': Ninfomut.values_at(3),
+                       'Total Corr': TC.values_at(3),
+                       'nplets': Nentropie.tuples(3).tolist()},
+                      index=pd.RangeIndex(start, start + nplet_count(atlas_size, 3)))
     #pd.DataFrame(test).to_csv('Summary_High_order_3_'+files[i][-10:],index=False, sep=' ', na_rep = 'NaN',header=None)
     #i+=1
     return test
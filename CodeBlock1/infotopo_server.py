@@ -8,7 +8,7 @@ import math
 import numpy as np
 import itertools
 import timeit
-from itertools import combinations, chain
+from itertools import combinations
 import logging
 from decimal import Decimal
 import matplotlib
@@ -22,6 +22,12 @@ from operator import itemgetter
 from mpl_toolkits.mplot3d import Axes3D
 import matplotlib.pyplot as plt
 import copy 
+from collections.abc import MutableMapping
+from scipy import sparse
+from scipy.special import logsumexp
+from multiprocessing import get_context, shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from nplet_index import nplet_count, nplet_block, rank_nplets
 
 
 #Main goal of this adaptation: 
@@ -35,88 +41,630 @@ server=True
 ###################################################################################
 
 def compute_info_path(data_mat, dimension_max, dimension_tot, nbtrials):
-    Nentropie={}
-    logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
-    logger = logging.getLogger("compute info_path")
-    print("Percent of tuples processed : 0")
-    # Compute all pairs of entropy and mutual informations
-    dimension_max_temp = dimension_max + 0
-    dimension_max = 2
-    allsubsets = lambda n: list(chain(*[combinations(range(1,n), ni) for ni in range(dimension_max+1)]))
-    list_tuples=allsubsets(dimension_tot+1)
-    del list_tuples[0]
-    if dimension_max != dimension_tot :
-         tot_numb=0
-         for  xxx in range(1,dimension_max+1):
-                tot_numb=tot_numb + self._binomial(dimension_tot,xxx)
-    counter=0
-    for tuple_var in list_tuples:
-        counter=counter+1
-        if dimension_max == dimension_tot:
-             if counter % int(pow(2, dimension_max) / 100) == 0:
-                 logger.info("PROGRESS: at percent #%i"  % (100*counter/pow(2,dimension_max)))
+    """
+    greedy path of maximal information on an already discretized matrix data_mat: starts from the pair of maximal 
+    mutual information and adds, up to dimension_max variables, the variable that maximizes the interaction information 
+    (see greedy_information_growth). nbtrials is not used. Returns the entropies and interaction informations that
+    were computed, as dictionaries.
+    """
+    data_columns, radix = discretized_columns(data_mat, dimension_tot)
+    infomut_cache = InfomutCache(dimension_tot, data_columns, radix)
+    for tuple_maxinfo, max_info in greedy_information_growth(infomut_cache, dimension_max):
+        print("The ", len(tuple_maxinfo),"-tuple with Maximum mutual info is :", tuple_maxinfo," with info: ",max_info)
+    return  infomut_cache.entropy_memo, infomut_cache.infomut_memo
+
+def greedy_information_growth(infomut_cache, dimension_max):
+    """
+    greedy k-tuple growth: the pair of maximal mutual information, then at each step the extension by one variable 
+    of maximal interaction information, until dimension_max variables. The entropies of all the pairs, and at each 
+    step those of all the candidate extensions, are computed by one batched call of the InfomutCache, whose memo 
+    is shared by all the steps (and by other searches using the same cache).
+    Returns the list of (tuple, information) along the path.
+    """
+    variables = range(1, infomut_cache.dimension_tot+1)
+    pairs = list(combinations(variables, 2))
+    infomut_cache.entropies([(var,) for var in variables] + pairs)
+    pair_infomut = [infomut_cache.infomut(pair) for pair in pairs]
+    tuple_maxinfo = pairs[int(np.argmax(pair_infomut))]
+    path = [(tuple_maxinfo, max(pair_infomut))]
+    while len(tuple_maxinfo) < min(dimension_max, infomut_cache.dimension_tot):
+        candidates, values = infomut_cache.extensions(tuple_maxinfo)
+        best = int(np.argmax(values))
+        tuple_maxinfo = tuple(sorted(tuple_maxinfo + (candidates[best],)))
+        path.append((tuple_maxinfo, float(values[best])))
+    return path
+
+
+###################################################################################
+################        BATCHED ENTROPIES OF SUBSETS        #######################
+###################################################################################
+
+# number of entries of the (subsets x sample) code matrix processed at once (32 MB of int64)
+CHUNK_ELEMENTS = 2**22
+
+def subset_codes(data_columns, subsets, radix):
+    """
+    data_columns : (N, T) int64 array, one discretized variable per row, values in [0, radix)
+    subsets : (M, k) array of 0-based variable indexes
+    returns a (M, T) int64 array where row m codes the joint state of the variables subsets[m]
+    at each sample point (Horner scheme, code = (..(x_1*radix + x_2)*radix ..) + x_k).
+    When radix**k does not fit in an int64 the codes are relabelled row-wise (dense rank < T) 
+    before adding the next variable, so that two different states never share a code.
+    """
+    subsets = np.asarray(subsets)
+    codes = np.zeros((subsets.shape[0], data_columns.shape[1]), dtype=np.int64)
+    bound = 1
+    for position in range(subsets.shape[1]):
+        if bound * radix > np.iinfo(np.int64).max:
+            codes = _row_dense_rank(codes)
+            bound = data_columns.shape[1]
+        codes *= radix
+        codes += data_columns[subsets[:, position]]
+        bound *= radix
+    return codes
+
+def _row_dense_rank(codes):
+    order = np.argsort(codes, axis=1)
+    sorted_codes = np.take_along_axis(codes, order, axis=1)
+    new_state = np.ones(codes.shape, dtype=bool)
+    new_state[:, 1:] = sorted_codes[:, 1:] != sorted_codes[:, :-1]
+    ranks = np.empty_like(codes)
+    np.put_along_axis(ranks, order, np.cumsum(new_state, axis=1) - 1, axis=1)
+    return ranks
+
+def _row_state_counts(codes):
+    # each row is sorted and the runs of equal codes are the counts of its states: returns the row and the count of every run
+    nb_points = codes.shape[1]
+    sorted_codes = np.sort(codes, axis=1)
+    new_state = np.ones(sorted_codes.shape, dtype=bool)
+    new_state[:, 1:] = sorted_codes[:, 1:] != sorted_codes[:, :-1]
+    starts = np.flatnonzero(new_state)
+    return starts // nb_points, np.diff(np.append(starts, sorted_codes.size))
+
+def row_entropies(codes):
+    """
+    entropy (in bits) of the empirical distribution of each row of a (M, T) code matrix:
+    each row is sorted, the runs of equal codes are the counts of the states, and the 
+    terms -p log2 p are summed back to their row with a single bincount.
+    """
+    nb_rows, nb_points = codes.shape
+    rows, counts = _row_state_counts(codes)
+    probability = counts / float(nb_points)
+    return np.bincount(rows, weights=-probability*np.log2(probability), minlength=nb_rows)
+
+def row_escort_entropies(codes, exponent):
+    """
+    entropy (in bits) of the escort (deformed) distribution p(k)^exponent / sum_i p(i)^exponent of each row of a (M, T) 
+    code matrix. The escort probabilities are normalized in log space (log-sum-exp per row, from the largest count of 
+    the row), so that large exponents such as the sample size do not underflow.
+    """
+    nb_rows = codes.shape[0]
+    rows, counts = _row_state_counts(codes)
+    log_weights = exponent*np.log(counts) # the 1/T of the probabilities cancels in the normalization
+    row_starts = np.flatnonzero(np.append(True, rows[1:] != rows[:-1]))
+    log_weights = log_weights - np.maximum.reduceat(log_weights, row_starts)[rows]
+    log_escort = log_weights - np.log(np.bincount(rows, weights=np.exp(log_weights), minlength=nb_rows))[rows]
+    return np.bincount(rows, weights=-np.exp(log_escort)*log_escort, minlength=nb_rows) / math.log(2)
+
+def discretized_columns(data_matrix, dimension_tot):
+    """
+    (dimension_tot, T) int64 copy of the first dimension_tot columns of a discretized matrix,
+    shifted to start at 0, and the common radix (largest value + 1) used to code them.
+    """
+    data_columns = np.ascontiguousarray(data_matrix[:, :dimension_tot].T).astype(np.int64)
+    data_columns -= data_columns.min(axis=1, keepdims=True)
+    return data_columns, int(data_columns.max()) + 1
+
+def order_entropies(data_columns, radix, order, start=0, stop=None, exponent=None):
+    """
+    entropies of the subsets of size order with lexicographic rank in [start, stop) 
+    (rank as in nplet_index, i.e. position in itertools.combinations), computed chunk by chunk.
+    With exponent, entropies of the escort distributions (see row_escort_entropies).
+    """
+    dimension_tot, nb_points = data_columns.shape
+    if stop is None:
+        stop = nplet_count(dimension_tot, order)
+    chunk_size = max(1, CHUNK_ELEMENTS // nb_points)
+    entropies = np.empty(stop - start)
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        codes = subset_codes(data_columns, nplet_block(dimension_tot, order, chunk_start, chunk_stop), radix)
+        if exponent is None:
+            entropies[chunk_start - start:chunk_stop - start] = row_entropies(codes)
         else:
-             if counter % int(tot_numb / 100) == 0:
-                 logger.info("PROGRESS: at percent #%i"  % (100*counter/tot_numb))
-        for x in range(0,len(tuple_var)):
-           if x==0:
-               matrix_temp=np.reshape(data_mat[:,tuple_var[x]-1],(data_mat[:,tuple_var[x]-1].shape[0],1))
-           else:
-               matrix_temp=np.concatenate((matrix_temp,np.reshape(data_mat[:,tuple_var[x]-1],(data_mat[:,tuple_var[x]-1].shape[0],1))),axis=1)
-        probability = self._compute_probability(matrix_temp)
-        for x,y in probability.items():
-                Nentropie[tuple_var]=Nentropie.get(tuple_var,0) + self._information(probability[x])
-    Ninfomut={}
-    for x,y in Nentropie.items():
-        for k in range(1, len(x)+1):
-            for subset in itertools.combinations(x, k):
-                Ninfomut[x]=Ninfomut.get(x,0)+ ((-1)**(len(subset)+1))*Nentropie[subset]
-
-     # find the pair of maximum information
-    max_info_temp = 0
-    for x,y in Ninfomut.items():
-        if len(x) == 2 :
-            if y > max_info_temp:
-                max_info_temp = y
-                tuple_maxinfo = x
-    print("The pair with Maximum mutual info is :", tuple_maxinfo," with info: ", max_info_temp)
-
-    # Compute all k-uplets of maximum information
-    max_info_next = 0
-    current_dim = 2
-    while  max_info_temp >   max_info_next :
-        max_info_temp = max_info_next
-        print("DImension of the analysis ", current_dim+1)
-        for xxx in range(1,dimension_tot+1):
-            if xxx not in tuple_maxinfo:
-                tuple_maxinfo=tuple_maxinfo + (xxx,)
-                print("tupple in computation ", tuple_maxinfo)
-                for k in range(1, len(tuple_maxinfo)+1):
-                    print("Number of variable added ", k)
-                    for subset in itertools.combinations(tuple_maxinfo, k):
-                        print("subset ", subset)
-                        if subset not in Nentropie:
-                            print("subset not in Nentropie ", subset)
-                            for x in range(0,len(subset)):
-                                if x==0:
-                                    matrix_temp=np.reshape(data_mat[:,subset[x]-1],(data_mat[:,subset[x]-1].shape[0],1))
-                                else:
-                                    matrix_temp=np.concatenate((matrix_temp,np.reshape(data_mat[:,subset[x]-1],(data_mat[:,subset[x]-1].shape[0],1))),axis=1)
-                            probability = self._compute_probability(matrix_temp)
-                            for x,y in probability.items():
-                                Nentropie[subset]=Nentropie.get(subset,0) + self._information(probability[x])
-                        Ninfomut[tuple_maxinfo]=Ninfomut.get(tuple_maxinfo,0)+ ((-1)**(len(subset)+1))*Nentropie[subset]
-                        print(" Ninfomut of ",tuple_maxinfo," is ", Ninfomut[tuple_maxinfo])
-        max_info_next =-100000
-        for a,b in Ninfomut.items():
-            if len(a) == current_dim :
-                if b > max_info_next:
-                    max_info_next = b
-                    tuple_maxinfo = a
-        print("The ", current_dim,"-tuple with Maximum mutual info is :", tuple_maxinfo," with info: ",max_info_next)
-        current_dim = current_dim + 1
-
-    return  Nentropie, Ninfomut
+            entropies[chunk_start - start:chunk_stop - start] = row_escort_entropies(codes, exponent)
+    return entropies
+
+def _entropy_shard(data_name, shape, radix, order, start, stop, exponent):
+    """
+    worker : entropies of the subsets of size order with rank in [start, stop), the discretized 
+    columns being read from the shared memory block data_name.
+    """
+    data_shm = shared_memory.SharedMemory(name=data_name)
+    data_columns = np.ndarray(shape, dtype=np.int64, buffer=data_shm.buf)
+    entropies = order_entropies(data_columns, radix, order, start, stop, exponent)
+    del data_columns # the view must be released before closing the shared memory
+    data_shm.close()
+    return entropies
+
+def parallel_forward_entropies(data_columns, radix, Nentropie, nb_of_workers, exponent=None):
+    """
+    fills the EntropyLattice Nentropie with the entropies of all its subsets, each order being split 
+    in nb_of_workers contiguous rank ranges computed by separate processes. The discretized columns are 
+    placed once in shared memory (read-only for the workers) and every worker returns its dense slice 
+    of entropies; the values are identical to the serial computation (same per-subset arithmetic).
+    """
+    data_shm = shared_memory.SharedMemory(create=True, size=max(data_columns.nbytes, 1))
+    try:
+        np.ndarray(data_columns.shape, dtype=np.int64, buffer=data_shm.buf)[:] = data_columns
+        with ProcessPoolExecutor(max_workers=nb_of_workers, mp_context=get_context('spawn')) as executor:
+            futures = {}
+            for order in range(1, Nentropie.dimension_max+1):
+                bounds = np.linspace(0, Nentropie.values_at(order).shape[0], nb_of_workers + 1).astype(np.int64)
+                for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                    if stop > start:
+                        futures[(order, start, stop)] = executor.submit(_entropy_shard, data_shm.name, data_columns.shape, 
+                                                                        radix, order, start, stop, exponent)
+            for (order, start, stop), future in futures.items():
+                Nentropie.values_at(order)[start:stop] = future.result()
+    finally:
+        data_shm.close()
+        data_shm.unlink()
+    return Nentropie
+
+
+def sweep_order_entropies(data_columns_list, radices, order):
+    """
+    order_entropies for several discretizations of the same variables (one (N, T) array and radix per 
+    resolution): the subsets are enumerated once, chunk by chunk, and each chunk is counted at every resolution.
+    """
+    dimension_tot, nb_points = data_columns_list[0].shape
+    total = nplet_count(dimension_tot, order)
+    chunk_size = max(1, CHUNK_ELEMENTS // nb_points)
+    entropies = [np.empty(total) for _ in data_columns_list]
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        subsets = nplet_block(dimension_tot, order, start, stop)
+        for data_columns, radix, values in zip(data_columns_list, radices, entropies):
+            values[start:stop] = row_entropies(subset_codes(data_columns, subsets, radix))
+    return entropies
+
+def convergence_order_entropies(data_columns, radix, order, checkpoints):
+    """
+    entropies of all the subsets of size order estimated on the first n points, for every n in the sorted list 
+    checkpoints, as a (len(checkpoints), C(N, order)) array. Each point is tagged with the first checkpoint 
+    that contains it and each row of codes is sorted once on the key (state, checkpoint), as in row_entropies. 
+    A run of equal keys is a group of points of the same state entering at the same checkpoint: it raises the 
+    count of the state from c to c' and adds c' log2 c' - c log2 c to sum_states c log2 c from that checkpoint on. 
+    The groups are summed per checkpoint with one bincount, and H(n) = log2 n - sum_states c log2 c / n.
+    """
+    dimension_tot = data_columns.shape[0]
+    nb_points = checkpoints[-1]
+    data_columns = data_columns[:, :nb_points]
+    total = nplet_count(dimension_tot, order)
+    chunk_size = max(1, CHUNK_ELEMENTS // nb_points)
+    nb_checkpoints = len(checkpoints)
+    entropies = np.empty((nb_checkpoints, total))
+    count = np.arange(nb_points+1, dtype=float)
+    count_log_count = count*np.log2(np.maximum(count, 1))
+    # first checkpoint that contains each point
+    first_checkpoint = np.searchsorted(checkpoints, np.arange(nb_points), side='right')
+    checkpoint_bits = max(nb_checkpoints - 1, 1).bit_length()
+    checkpoint_size = np.asarray(checkpoints, dtype=float)[:, None]
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        keys = subset_codes(data_columns, nplet_block(dimension_tot, order, start, stop), radix)
+        if keys.max(initial=0) >= 2**(62 - checkpoint_bits):
+            keys = _row_dense_rank(keys)
+        keys <<= checkpoint_bits
+        keys |= first_checkpoint
+        keys.sort(axis=1)
+        keys = keys.ravel()
+        new_group = np.ones(keys.shape, dtype=bool)
+        new_group[1:] = keys[1:] != keys[:-1]
+        groups = np.flatnonzero(new_group)
+        group_keys = keys[groups]
+        new_state = np.ones(groups.shape, dtype=bool)
+        new_state[1:] = (group_keys[1:] >> checkpoint_bits) != (group_keys[:-1] >> checkpoint_bits)
+        new_state |= groups % nb_points == 0
+        run_start = np.maximum.accumulate(np.where(new_state, groups, 0))
+        group_end = np.append(groups[1:], keys.size)
+        cells = (groups // nb_points)*(nb_checkpoints + 1) + (group_keys & ((1 << checkpoint_bits) - 1))
+        sum_count_log_count = np.bincount(cells, minlength=(stop - start)*(nb_checkpoints + 1),
+                                          weights=count_log_count[group_end - run_start] - count_log_count[groups - run_start])
+        sum_count_log_count = np.cumsum(sum_count_log_count.reshape(stop - start, -1)[:, :-1], axis=1).T
+        entropies[:, start:stop] = np.log2(checkpoint_size) - sum_count_log_count/checkpoint_size
+    return entropies
+
+def shuffled_order_entropies(shuffled_columns, radix, order):
+    """
+    entropies of all the subsets of size order for a batch of shuffled data sets, given as a (S, N, T) array of 
+    discretized columns, as a (S, C(N, order)) array. The S shuffles of a chunk of subsets are coded together 
+    as one (S * chunk, T) matrix of codes and counted by a single row_entropies call.
+    """
+    nb_of_shuffle, dimension_tot, nb_points = shuffled_columns.shape
+    stacked_columns = shuffled_columns.reshape(nb_of_shuffle*dimension_tot, nb_points)
+    offsets = dimension_tot*np.arange(nb_of_shuffle, dtype=np.int64)[:, None, None]
+    total = nplet_count(dimension_tot, order)
+    chunk_size = max(1, CHUNK_ELEMENTS // (nb_points*nb_of_shuffle))
+    entropies = np.empty((nb_of_shuffle, total))
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        subsets = (nplet_block(dimension_tot, order, start, stop)[None] + offsets).reshape(-1, order)
+        entropies[:, start:stop] = row_entropies(subset_codes(stacked_columns, subsets, radix)).reshape(nb_of_shuffle, stop - start)
+    return entropies
+
+def lattice_entropies(data_columns, radix, Nentropie, exponent=None):
+    """
+    fills the EntropyLattice Nentropie (dimension_max = dimension_tot) with the entropies of all the 
+    2^n-1 subsets, by marginalization of the joint distribution instead of re-estimating each subset.
+    The joint distribution is kept as the array of the distinct mixed-radix codes of the observed states
+    and their counts. A marginal is obtained from the distribution of a parent subset by zeroing the digit 
+    of the removed variable and re-aggregating the counts of the codes that became equal. The lattice is 
+    walked depth first, removing the variables in increasing order so that every subset is reached once 
+    and is projected from its parent, which is still in memory.
+    When radix**n does not fit in an int64 the entropies are computed order by order with order_entropies.
+    With exponent, the escort distribution of the joint (computed in log space) is marginalized instead of the counts,
+    i.e. the marginals are taken of the deformed joint probabilities.
+    """
+    dimension_tot, nb_points = data_columns.shape
+    if radix ** dimension_tot > np.iinfo(np.int64).max:
+        if exponent is not None:
+            raise ValueError("too many states to marginalize the deformed joint distribution, use forward_computation_mode")
+        for order in range(1, dimension_tot+1):
+            Nentropie.values_at(order)[:] = order_entropies(data_columns, radix, order)
+        return Nentropie
+    weights = radix ** np.arange(dimension_tot, dtype=np.int64)
+    codes, counts = np.unique(weights @ data_columns, return_counts=True)
+    if exponent is not None:
+        log_weights = exponent*np.log(counts)
+        counts = np.exp(log_weights - logsumexp(log_weights))
+
+    def visit(codes, counts, variables, last_removed):
+        probability = counts / counts.sum()
+        probability = probability[probability > 0]
+        Nentropie[tuple(var+1 for var in variables)] = float(-np.sum(probability*np.log2(probability)))
+        if len(variables) == 1:
+            return
+        for var in variables:
+            if var > last_removed:
+                projected = codes - ((codes // weights[var]) % radix) * weights[var]
+                marginal_codes, inverse = np.unique(projected, return_inverse=True)
+                marginal_counts = np.bincount(inverse.reshape(-1), weights=counts)
+                visit(marginal_codes, marginal_counts, tuple(v for v in variables if v != var), var)
+
+    visit(codes, counts, tuple(range(dimension_tot)), -1)
+    return Nentropie
+
+
+###################################################################################
+################     PATCHES OF IMAGES ON STRIDED VIEWS     #######################
+###################################################################################
+
+def patch_windows(image, patch_shape):
+    """
+    read-only strided view of all the overlapping patches of an image (or volume): for a (H, W) image and
+    a (py, px) patch the view has shape (H-py+1, W-px+1, py, px) and shares the memory of the image.
+    """
+    return np.lib.stride_tricks.sliding_window_view(image, tuple(patch_shape))
+
+class PatchColumns:
+    """
+    discretized columns of the patch matrix of an image, read on demand from its sliding windows: 
+    variable j is the pixel at position j of the patch (row-major), sample t is the t-th patch. 
+    Indexing with an array of M variables returns their (M, T) int64 block, so that subset_codes and 
+    order_entropies run chunk by chunk without building the (T, patch size) patch matrix.
+    The discretization is the one of _resample_matrix on that matrix (sampling_mode 1: min and max 
+    of each column, sampling_mode 2: of the whole image). The values are in [0, nb_of_values], 
+    the float rounding at the maximum of a column can give nb_of_values: codes use radix nb_of_values+1.
+    """
+    def __init__(self, image, patch_shape, nb_of_values, sampling_mode=1):
+        self.windows = patch_windows(image, patch_shape)
+        self.patch_shape = tuple(patch_shape)
+        self.nb_of_values = nb_of_values
+        image_axes = tuple(range(image.ndim))
+        self.shape = (int(np.prod(self.patch_shape)), int(np.prod(self.windows.shape[:image.ndim])))
+        if sampling_mode == 1:
+            self.lower = self.windows.min(axis=image_axes).reshape(-1)
+            self.amplitude = self.windows.max(axis=image_axes).reshape(-1) - self.lower
+        else:
+            self.lower = np.full(self.shape[0], np.min(image))
+            self.amplitude = np.full(self.shape[0], np.max(image) - np.min(image))
+
+    def __getitem__(self, variables):
+        variables = np.asarray(variables)
+        values = self.windows[(Ellipsis,) + np.unravel_index(variables, self.patch_shape)]
+        values = values.reshape(self.shape[1], variables.shape[0]).T
+        return np.ceil(((values - self.lower[variables, None])*(self.nb_of_values-1))
+                       /(self.amplitude[variables, None])).astype(np.int64)
+
+
+###################################################################################
+################        ARRAY-BACKED SIMPLICIAL LATTICE     #######################
+###################################################################################
+
+class EntropyLattice(MutableMapping):
+    """
+    EntropyLattice : 
+    stores a function of the subsets of variables (joint entropies, mutual informations, total correlations...)
+    as one dense float array per order, the subset of size k with combinadic (lexicographic) rank r being
+    stored at values_at(k)[r]. Keys are the usual 1-based sorted tuples, so the lattice can be used in place 
+    of the tuple-keyed dictionaries (iteration by increasing order, then itertools.combinations order).
+    Entries that were never set hold NaN and are not part of the mapping.
+
+    Parameters:
+    dimension_tot : (integer) total Nb of Random Variable
+    dimension_max : (integer) maximum size of the stored subsets
+    """
+    def __init__(self, dimension_tot, dimension_max):
+        self.dimension_tot = dimension_tot
+        self.dimension_max = dimension_max
+        self.orders = {order : np.full(nplet_count(dimension_tot, order), np.nan) for order in range(1, dimension_max+1)}
+
+    def _rank(self, key):
+        if not isinstance(key, tuple) or not 0 < len(key) <= self.dimension_max:
+            raise KeyError(key)
+        order = len(key)
+        rank = self.orders[order].shape[0] - 1
+        previous = 0
+        for position, var in enumerate(key):
+            if not previous < var <= self.dimension_tot:
+                raise KeyError(key)
+            rank -= math.comb(self.dimension_tot - var, order - position)
+            previous = var
+        return order, rank
+
+    def __getitem__(self, key):
+        order, rank = self._rank(key)
+        value = self.orders[order][rank]
+        if value != value:
+            raise KeyError(key)
+        return float(value)
+
+    def __setitem__(self, key, value):
+        order, rank = self._rank(key)
+        self.orders[order][rank] = value
+
+    def __delitem__(self, key):
+        order, rank = self._rank(key)
+        if self.orders[order][rank] != self.orders[order][rank]:
+            raise KeyError(key)
+        self.orders[order][rank] = np.nan
+
+    def __iter__(self):
+        for order, values in self.orders.items():
+            chunk_size = 2**16
+            for start in range(0, values.shape[0], chunk_size):
+                stop = min(start + chunk_size, values.shape[0])
+                present = ~np.isnan(values[start:stop])
+                yield from map(tuple, self.tuples(order, start, stop)[present].tolist())
+
+    def __len__(self):
+        return int(sum(np.count_nonzero(~np.isnan(values)) for values in self.orders.values()))
+
+    def values_at(self, order):
+        """ dense array of the values of all the subsets of size order, indexed by combinadic rank """
+        return self.orders[order]
+
+    def tuples(self, order, start=0, stop=None):
+        """ (stop - start, order) array of the 1-based subsets of size order with rank in [start, stop) """
+        if stop is None:
+            stop = nplet_count(self.dimension_tot, order)
+        return nplet_block(self.dimension_tot, order, start, stop) + 1
+
+    def empty_like(self):
+        return EntropyLattice(self.dimension_tot, self.dimension_max)
+
+
+###################################################################################
+################     MOBIUS INVERSION ON THE LATTICE        #######################
+###################################################################################
+
+# number of subsets of one order processed at once by the face tables
+FACE_CHUNK_SIZE = 2**16
+
+def subface_ranks(subsets, sub_order, dimension_tot):
+    """
+    face table of a block of subsets: for a (M, k) array of 0-based subsets, returns the (M, C(k, sub_order)) 
+    array of the combinadic ranks of all their faces of size sub_order, so that the values of the faces are 
+    gathered with lattice.values_at(sub_order)[faces].
+    """
+    positions = np.array(list(combinations(range(subsets.shape[1]), sub_order)), dtype=np.int64)
+    faces = subsets[:, positions].reshape(-1, sub_order)
+    return rank_nplets(faces, dimension_tot).reshape(subsets.shape[0], positions.shape[0])
+
+def mobius_inversion(Nentropie):
+    """
+    interaction informations of all the subsets of an EntropyLattice, 
+    I_k(S) = sum over the non-empty faces T of S of (-1)^(|T|+1) H(T),
+    computed per order and per chunk as signed sums of the entropies gathered with the face tables.
+    """
+    Ninfomut = Nentropie.empty_like()
+    for order in range(1, Nentropie.dimension_max+1):
+        infomut = Ninfomut.values_at(order)
+        for start in range(0, infomut.shape[0], FACE_CHUNK_SIZE):
+            stop = min(start + FACE_CHUNK_SIZE, infomut.shape[0])
+            subsets = nplet_block(Nentropie.dimension_tot, order, start, stop)
+            infomut[start:stop] = Nentropie.values_at(order)[start:stop] * (-1)**(order+1)
+            for sub_order in range(1, order):
+                faces = subface_ranks(subsets, sub_order, Nentropie.dimension_tot)
+                infomut[start:stop] += (-1)**(sub_order+1) * Nentropie.values_at(sub_order)[faces].sum(axis=1)
+    return Ninfomut
+
+def shuffled_information_quantiles(shuffled_entropies, dimension_tot, order, quantiles):
+    """
+    quantiles over the shuffles of the interaction informations and total correlations of all the subsets of 
+    size order. shuffled_entropies[k] is the (S, C(N, k)) array of the entropies of the k-subsets of the S 
+    shuffles (S can be 1 for values shared by all the shuffles, such as the marginals). I_k and G_k are computed 
+    per chunk with the face tables, the shuffle index being the leading axis, and only their quantiles are kept: 
+    returns two (len(quantiles), C(N, order)) arrays.
+    """
+    total = nplet_count(dimension_tot, order)
+    infomut_quantiles = np.empty((len(quantiles), total))
+    total_corr_quantiles = np.empty((len(quantiles), total))
+    for start in range(0, total, FACE_CHUNK_SIZE):
+        stop = min(start + FACE_CHUNK_SIZE, total)
+        subsets = nplet_block(dimension_tot, order, start, stop)
+        infomut = shuffled_entropies[order][:, start:stop] * (-1)**(order+1)
+        for sub_order in range(1, order):
+            faces = subface_ranks(subsets, sub_order, dimension_tot)
+            infomut = infomut + (-1)**(sub_order+1) * shuffled_entropies[sub_order][:, faces].sum(axis=2)
+        vertices = subface_ranks(subsets, 1, dimension_tot)
+        total_corr = shuffled_entropies[1][:, vertices].sum(axis=2) - shuffled_entropies[order][:, start:stop]
+        infomut_quantiles[:, start:stop] = np.quantile(infomut, quantiles, axis=0)
+        total_corr_quantiles[:, start:stop] = np.quantile(total_corr, quantiles, axis=0)
+    return infomut_quantiles, total_corr_quantiles
+
+def total_correlations(Nentropie):
+    """
+    total correlations G_k(S) = sum of the entropies of the vertices of S - H(S), from the face tables of the vertices.
+    """
+    Ntotal_correlation = Nentropie.empty_like()
+    for order in range(1, Nentropie.dimension_max+1):
+        total_corr = Ntotal_correlation.values_at(order)
+        for start in range(0, total_corr.shape[0], FACE_CHUNK_SIZE):
+            stop = min(start + FACE_CHUNK_SIZE, total_corr.shape[0])
+            vertices = subface_ranks(nplet_block(Nentropie.dimension_tot, order, start, stop), 1, Nentropie.dimension_tot)
+            total_corr[start:stop] = Nentropie.values_at(1)[vertices].sum(axis=1) - Nentropie.values_at(order)[start:stop]
+    return Ntotal_correlation
+
+def information_volumes(Nentropie, Ninfomut):
+    """
+    information volumes V_k(S) = H(S) - I_k(S), order by order.
+    """
+    Ninfo_volume = Nentropie.empty_like()
+    for order in range(1, Nentropie.dimension_max+1):
+        np.subtract(Nentropie.values_at(order), Ninfomut.values_at(order), out=Ninfo_volume.values_at(order))
+    return Ninfo_volume
+
+
+def conditional_infomut(Ninfomut):
+    """
+    conditional informations of all the edges of an EntropyLattice of interaction informations (chain rule):
+    I(S - {s_p} | s_p) = I(S - {s_p}) - I(S) for every k-tuple S and every position p.
+    Returns a list cond where cond[k-1] is a dense (C(N, k), k) array, row = rank of S, column p = the conditioning 
+    variable S[p] (cond[0] is NaN, a single variable has no conditional information). Each column is one gather 
+    of the (k-1)-faces (by rank) and one subtraction.
+    """
+    cond = [np.full((Ninfomut.dimension_tot, 1), np.nan)]
+    for order in range(2, Ninfomut.dimension_max+1):
+        values = np.empty((Ninfomut.values_at(order).shape[0], order))
+        for start in range(0, values.shape[0], FACE_CHUNK_SIZE):
+            stop = min(start + FACE_CHUNK_SIZE, values.shape[0])
+            subsets = nplet_block(Ninfomut.dimension_tot, order, start, stop)
+            for position in range(order):
+                faces = rank_nplets(np.delete(subsets, position, axis=1), Ninfomut.dimension_tot)
+                values[start:stop, position] = Ninfomut.values_at(order-1)[faces] - Ninfomut.values_at(order)[start:stop]
+        cond.append(values)
+    return cond
+
+
+def pairwise_information_matrix(Ninfomut):
+    """
+    N x N matrix of the pairwise mutual informations I2 of an EntropyLattice, with the I1 (entropies) on the diagonal.
+    The pairs (i < j) in the order of np.triu_indices are the pairs by increasing combinadic rank, so the order-2 array
+    is scattered in the upper triangle at once and mirrored.
+    """
+    adjacency_matrix = np.zeros((Ninfomut.dimension_tot, Ninfomut.dimension_tot))
+    rows, cols = np.triu_indices(Ninfomut.dimension_tot, 1)
+    adjacency_matrix[rows, cols] = Ninfomut.values_at(2)
+    adjacency_matrix[cols, rows] = Ninfomut.values_at(2)
+    adjacency_matrix[np.diag_indices(Ninfomut.dimension_tot)] = Ninfomut.values_at(1)
+    return adjacency_matrix
+
+def top_k_pairwise(adjacency_matrix, top_k):
+    """
+    sparse (scipy csr) symmetric network keeping, for every node, its top_k largest pairwise informations 
+    (the diagonal is excluded; an edge is kept if it is in the top_k of either of its nodes).
+    """
+    nb_nodes = adjacency_matrix.shape[0]
+    top_k = min(top_k, nb_nodes-1)
+    off_diagonal = adjacency_matrix.copy()
+    off_diagonal[np.diag_indices(nb_nodes)] = -np.inf
+    cols = np.argpartition(-off_diagonal, top_k-1, axis=1)[:, :top_k].ravel()
+    rows = np.repeat(np.arange(nb_nodes), top_k)
+    network = sparse.csr_matrix((adjacency_matrix[rows, cols], (rows, cols)), shape=adjacency_matrix.shape)
+    return network.maximum(network.T).tocsr()
+
+
+###################################################################################
+################        LAZY INTERACTION INFORMATION        #######################
+###################################################################################
+
+class InfomutCache:
+    """
+    InfomutCache : 
+    interaction informations of arbitrary tuples evaluated on demand, for the searches that go beyond dimension_max.
+    A value is read from Ninfomut when it is there; otherwise it is obtained by Mobius inversion of the entropies 
+    of its faces, which are read from Nentropie or computed from the discretized columns (in batches, with 
+    subset_codes and row_entropies) and memoized. Keys are 1-based sorted tuples, as in EntropyLattice.
+
+    Parameters:
+    dimension_tot : (integer) total Nb of Random Variable
+    data_columns, radix : discretized columns (see discretized_columns), None if only the given values can be used
+    Nentropie, Ninfomut : (mappings) already computed entropies and interaction informations, or None
+    """
+    def __init__(self, dimension_tot, data_columns=None, radix=None, Nentropie=None, Ninfomut=None):
+        self.dimension_tot = dimension_tot
+        self.data_columns = data_columns
+        self.radix = radix
+        self.Nentropie = Nentropie if Nentropie is not None else {}
+        self.Ninfomut = Ninfomut if Ninfomut is not None else {}
+        self.entropy_memo = {}
+        self.infomut_memo = {}
+
+    def entropies(self, keys):
+        by_order = {}
+        for key in set(keys):
+            if key in self.entropy_memo:
+                continue
+            if key in self.Nentropie:
+                self.entropy_memo[key] = self.Nentropie[key]
+            elif self.data_columns is None:
+                raise ValueError("the entropy of %s is not available: data_matrix is needed beyond dimension_max" % (key,))
+            else:
+                by_order.setdefault(len(key), []).append(key)
+        if by_order:
+            # all the missing subsets in a single code matrix: the shorter ones are padded with a constant 
+            # variable (index dimension_tot, all zeros), which does not change their entropies
+            group = [key for order in sorted(by_order) for key in by_order[order]]
+            max_order = max(by_order)
+            subsets = np.full((len(group), max_order), self.dimension_tot, dtype=np.int64)
+            for row, key in enumerate(group):
+                subsets[row, :len(key)] = np.array(key) - 1
+            padded_columns = np.vstack((self.data_columns, np.zeros((1, self.data_columns.shape[1]), dtype=np.int64)))
+            chunk_size = max(1, CHUNK_ELEMENTS // self.data_columns.shape[1])
+            for start in range(0, len(group), chunk_size):
+                values = row_entropies(subset_codes(padded_columns, subsets[start:start+chunk_size], self.radix))
+                self.entropy_memo.update(zip(group[start:start+chunk_size], values.tolist()))
+        return np.array([self.entropy_memo[key] for key in keys])
+
+    def infomut(self, key):
+        if key in self.Ninfomut:
+            return self.Ninfomut[key]
+        if key not in self.infomut_memo:
+            faces = [face for k in range(1, len(key)+1) for face in combinations(key, k)]
+            signs = np.array([(-1)**(len(face)+1) for face in faces])
+            self.infomut_memo[key] = float(np.sum(signs*self.entropies(faces)))
+        return self.infomut_memo[key]
+
+    def extensions(self, key):
+        """
+        variables v not in key and the interaction informations of all the tuples key + (v,), computed together as
+        I(key + v) = I(key) + sum over the faces T of key (empty face included) of (-1)^|T| H(T + v).
+        """
+        candidates = [var for var in range(1, self.dimension_tot+1) if var not in key]
+        extended = [tuple(sorted(key + (var,))) for var in candidates]
+        if all(tuple_var in self.Ninfomut or tuple_var in self.infomut_memo for tuple_var in extended):
+            return candidates, np.array([self.infomut(tuple_var) for tuple_var in extended])
+        faces = [face for k in range(0, len(key)+1) for face in combinations(key, k)]
+        signs = np.array([(-1)**len(face) for face in faces])
+        extended_faces = [tuple(sorted(face + (var,))) for face in faces for var in candidates]
+        # one call for the faces of all the extensions and those of key itself (used by self.infomut(key))
+        face_entropies = self.entropies(extended_faces + faces[1:])[:len(extended_faces)].reshape(len(faces), len(candidates))
+        values = self.infomut(key) + signs @ face_entropies
+        self.infomut_memo.update(zip(extended, values.tolist()))
+        return candidates, values
 
 
 
@@ -189,6 +737,12 @@ class infotopo:
     number_of_max_val: (integer) number of the first k-tuples with maximum or minimum value to retrieve in a dictionary and to plot the corresponding data 
     points k-subspace.             
 
+    nb_of_workers: (integer) number of processes used to compute the joint entropies in forward_computation_mode 
+                    (1: serial computation, see parallel_forward_entropies).
+
+    deformation_exponent: (real > 0 or None) exponent n of the escort distribution p(n,k) in deformed_probability_mode 
+                    (None: n is the sample size, i.e. the number of rows of the data matrix).
+
     """
     def __init__(self, 
         dimension_max = 16, 
@@ -206,7 +760,9 @@ class infotopo:
         p_value = 0.05, 
         nb_of_shuffle = 20,
         dim_to_rank = 2,
-        number_of_max_val = 2):
+        number_of_max_val = 2,
+        nb_of_workers = 1,
+        deformation_exponent = None):
 
         self.dimension_max = dimension_max  
         self.dimension_tot = dimension_tot
@@ -224,6 +780,8 @@ class infotopo:
         self.nb_of_shuffle = nb_of_shuffle
         self.dim_to_rank = dim_to_rank
         self.number_of_max_val = number_of_max_val
+        self.nb_of_workers = nb_of_workers
+        self.deformation_exponent = deformation_exponent
 
     def _validate_parameters(self):
         if self.dimension_max < 2 :
@@ -252,7 +810,11 @@ class infotopo:
         if not self.compute_shuffle:
             self.nb_of_shuffle = 0
         if self.dim_to_rank >= self.dimension_max :
-            raise ValueError("dim_to_rank must be smaller than dimension_max")      
+            raise ValueError("dim_to_rank must be smaller than dimension_max")
+        if self.nb_of_workers < 1 :
+            raise ValueError("nb_of_workers must be greater than 0")      
+        if self.deformation_exponent is not None and self.deformation_exponent <= 0 :
+            raise ValueError("deformation_exponent must be greater than 0")      
                 
 
 
@@ -270,7 +832,9 @@ sampling_mode : (integer: 1,2,3)
 TO BE DONE: use panda dataframe .resample to do it...                        
     """                
 
-    def _resample_matrix(self, data_matrix):
+    def _resample_matrix(self, data_matrix, nb_of_values=None):
+        if nb_of_values is None:
+            nb_of_values = self.nb_of_values
         if self.work_on_transpose: 
             data_matrix = data_matrix.transpose()
     # find the Min and the Max of the matrix:
@@ -283,7 +847,7 @@ TO BE DONE: use panda dataframe .resample to do it...
     #create the amplitude matrix
         ampl_matrix = max_matrix - min_matrix
     #WE RESCALE THE MATRICE AND SAMPLE IT into  nb_of_values #
-        data_matrix = np.ceil(((data_matrix-min_matrix)*(self.nb_of_values-1))/(ampl_matrix)).astype(int)
+        data_matrix = np.ceil(((data_matrix-min_matrix)*(nb_of_values-1))/(ampl_matrix)).astype(int)
         return data_matrix
 
 
@@ -294,55 +858,44 @@ TO BE DONE: use panda dataframe .resample to do it...
     """
 This procedure extract overlapping-convolutional patches of size square_root(dimension_max)*square_root(dimension_max) from the images.
 For example if dimension_max=16 , then the procedure will extract all "sliding" 4*4 pixels patchs of the image                          
+The patches are read on a strided view of the image (see patch_windows), the patch matrix is written in a single copy.
     """     
 
     def convolutional_patchs(self, data_matrix):
-
-        data_matrix_new = []
-        sub_matrix = []
-        patch_x = int(np.sqrt(self.dimension_max))
-        patch_y = int(np.sqrt(self.dimension_max))  
-        self.dimension_max = (int(np.sqrt(self.dimension_max)))*(int(np.sqrt(self.dimension_max))) 
+        patch_side = int(np.sqrt(self.dimension_max))
+        self.dimension_max = patch_side*patch_side 
         self.dimension_tot = self.dimension_max 
-        width = data_matrix.shape[1]
-        height = data_matrix.shape[0]
-        for yyyy in range(0, height - (patch_y-1)):
-            for xxxx in range(0, width - (patch_x-1)):
-                sub_matrix.append([data_matrix[yyyy: yyyy + patch_y, xxxx: xxxx + patch_x] ])       
-        data_matrix_new = np.array(sub_matrix)
-        data_matrix_new = np.reshape(data_matrix_new, ((height - (patch_y - 1))*(width - (patch_x - 1)), self.dimension_max))    
+        data_matrix_new = patch_windows(data_matrix, (patch_side, patch_side)).reshape(-1, self.dimension_max)
         self.sample_size = data_matrix_new.shape[0]
         return data_matrix_new
 
-
-################################################################
-#########                 compute                     ##########
-#########         probability distributions           ##########
-################################################################
     """
-compute the joint probability distribution of all variables
-To avoid to have to explore all  possible  probability (sparse data)
-we encode probability as dictionanry, each existing probability has a key
-
-TO DO: import the new simpler function that compute probability and compare
-    """
-
-    def _compute_probability(self, data_matrix):
-        probability={}
-        # in case the data_matrix has a single variable-dimension reshape the vector to matrix
-        if len(data_matrix.shape)==1 :
-            data_matrix=np.reshape(data_matrix,(data_matrix.shape[0],1))
-        for row in range(data_matrix.shape[0]):
-            x=''
-            for col in range(0,data_matrix.shape[1]):
-                x= x+str(int((data_matrix[row,col])))
-            probability[x]=probability.get(x,0)+1
-        Nbtot=0
-        for i in probability.items():
-            Nbtot=Nbtot+i[1]
-        for i,j in probability.items():
-               probability[i]=j/float(Nbtot)
-        return probability     
+Forward entropies of the patches of an image (or of a volume with a 3D patch_shape) without the patch matrix: 
+the pixels of the patches are gathered from the strided view by blocks of subsets (see PatchColumns) and 
+discretized on the fly, so that the memory stays bounded by CHUNK_ELEMENTS whatever the size of the image.
+patch_shape = None takes the square patches of convolutional_patchs. The variables are the pixels of the patch 
+(dimension_tot = patch size) and the points are the patches; the entropies are the ones of 
+simplicial_entropies_decomposition in forward_computation_mode on the patch matrix, up to dimension_max.
+    """
+
+    def patch_entropies(self, image, patch_shape=None):
+        logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+        logger = logging.getLogger("compute Patch-Entropy")
+        if patch_shape is None:
+            patch_side = int(np.sqrt(self.dimension_max))
+            patch_shape = (patch_side, patch_side)
+        data_columns = PatchColumns(image, patch_shape, self.nb_of_values, self.sampling_mode)
+        self.dimension_tot = data_columns.shape[0]
+        self.dimension_max = min(self.dimension_max, self.dimension_tot)
+        self.sample_size = data_columns.shape[1]
+        self._validate_parameters()
+        exponent = self._deformation_exponent(self.sample_size)
+        Nentropie = EntropyLattice(self.dimension_tot, self.dimension_max)
+        for order in range(1, self.dimension_max+1):
+            Nentropie.values_at(order)[:] = order_entropies(data_columns, self.nb_of_values+1, order, exponent=exponent)
+            logger.info("PROGRESS: order %i done (%i tuples)" % (order, Nentropie.values_at(order).shape[0]))
+        return Nentropie
+
 
 ###########################################################################################################################
 #########          COMPUTE DEFORMED PROBABILITY            ##########
@@ -350,43 +903,23 @@ TO DO: import the new simpler function that compute probability and compare
 ############################################################
     """
     compute the "escort distribution" also called the "deformed probabilities".
-    p(n,k)= p(k)^n/ (sum(i)p(i)^n   , where n is the sample size. 
+    p(n,k)= p(k)^n/ (sum(i)p(i)^n   , where n is the sample size (or deformation_exponent). 
     [1] Umarov, S., Tsallis C. and Steinberg S., On a q-Central Limit Theorem Consistent with Nonextensive Statistical Mechanics, Milan j. math. 76 (2008), 307–328
     [2] Bercher,  Escort entropies and divergences and related canonical distribution. Physics Letters A Volume 375, Issue 33, 1 August 2011, Pages 2969-2973
     [3] A. Chhabra, R. V. Jensen, Direct determination of the f(α) singularity spectrum.  Phys. Rev. Lett. 62 (1989) 1327.
     [4] C. Beck, F. Schloegl, Thermodynamics of Chaotic Systems, Cambridge University Press, 1993.
     [5] Zhang, Z., Generalized Mutual Information.  July 11, 2019
-TO DO: import the new simpler function that compute probability and compare and use optimal power computation:
-https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-an-integer-based-power-function-powint-int
+The normalization is done in log space (log-sum-exp), since p(k)^n underflows to 0 for all but the most 
+probable states when n is the sample size. The entropies of the escort distributions of all the subsets are 
+computed on the integer codes by row_escort_entropies (forward mode) and lattice_entropies (whole lattice).
     """
  
-
-    def _compute_deformed_probability(self, data_matrix):
-        probability={}
-        # in case the data_matrix has a single variable-dimension reshape the vector to matrix
-        if len(data_matrix.shape)==1 :
-            data_matrix=np.reshape(data_matrix,(data_matrix.shape[0],1))
-        sample_size_data= data_matrix.shape[0] 
-        for row in range(data_matrix.shape[0]):
-            x=''
-            for col in range(0,data_matrix.shape[1]):
-                x= x+str(int((data_matrix[row,col])))
-            probability[x]=probability.get(x,0)+1
-        Nbtot=0
-        for i in probability.items():
-            Nbtot=Nbtot+i[1]
-        for i,j in probability.items():
-               probability[i]=j/float(Nbtot)
-        Nbtot_bis=0       
-        sum_prob=0
-        for i in probability.items():
-            Nbtot_bis=Nbtot_bis+(i[1]**sample_size_data)
-        for i,j in probability.items():
-               probability[i]=(j**sample_size_data)/(Nbtot_bis)
-               print("probability[i]",probability[i])
-               sum_prob=sum_prob+probability[i]
-        print("sum_prob",sum_prob)       
-        return probability           
+    def _deformation_exponent(self, nb_points):
+        if not self.deformed_probability_mode:
+            return None
+        if self.deformation_exponent is None:
+            return nb_points
+        return self.deformation_exponent
 
 # ###############################################################
 # ########          SOME FUNCTIONS USEFULLS            ##########
@@ -451,96 +984,33 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
         self._decode(Code_order,n,k,combinat)
 
 
-# ##################################################################################
-# ###############    COMPUTE ENTROPY                         #######################
-# ##################################################################################
-
-    def _compute_entropy(self, probability):
-        ntuple=[]
-        ntuple1_input=[]
-        Nentropie={}
-        self._decode(0, self.dimension_tot, self.dimension_max, ntuple1_input)
-        logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
-        logger = logging.getLogger("compute Proba-Entropy")
-        print("Percent of tuples processed : 0")
-        for x in range(0,(2**self.dimension_max)-1):
-            if self.dimension_max> 10 :
-                 if (x) % int(pow(2,self.dimension_max) / 100) == 0:
-                     logger.info("PROGRESS: at percent #%i"  % (100*x/pow(2,self.dimension_max)))
-            ntuple=[]
-            orderInf=0
-            self._decode_all(x,self.dimension_max,orderInf,ntuple)
-            tuple_code=()
-            probability2={}
-            for z in range(0,len(ntuple)):
-                concat=()
-                concat=(ntuple1_input[ntuple[z]-1],)
-                tuple_code=tuple_code+concat
-            for x,_ in probability.items():
-                Codeproba=''
-                length=0
-                for w in range(1,self.dimension_max+1):
-                    if ntuple[length]!=w:
-                        Codeproba=Codeproba+'0'
-                    else:
-                        Codeproba=Codeproba+x[ntuple[length]-1:ntuple[length]]
-                        if length<(len(ntuple)-1):
-                            length=length+1
-                probability2[Codeproba]=probability2.get(Codeproba,0)+probability.get(x,0)
-            Nentropie[tuple_code]=0
-# to change: the program computes too many times the entropy:  m*2**n instead of
-            for x,y in probability2.items():
-                Nentropie[tuple_code]=Nentropie.get(tuple_code,0) + self._information(probability2[x])
-            probability2={}
-            probability2.clear()
-            del(probability2)
-        return (Nentropie)
-
-
 ###################################################################################
 ################  COMPUTE FORWARD-CO PROBABILITY AND ENTROPIES  ###################
 ###################################################################################
 
 
 
+    """
+Batched forward mode: all the subsets of one order are gathered chunk by chunk as a (subsets x sample_size)
+matrix of integer codes (see subset_codes) and their entropies are obtained in one pass by row-wise sort 
+and run-length counting (see row_entropies, or row_escort_entropies in deformed_probability_mode). They are 
+written directly in the per-order arrays of an EntropyLattice, whose keys are 1-based tuples, by 
+increasing order then itertools.combinations order.
+    """
+
     def _compute_forward_entropies(self, data_matrix):
-        Nentropie={}
+        Nentropie=EntropyLattice(self.dimension_tot, self.dimension_max)
         logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
         logger = logging.getLogger("compute Proba-Entropy")
-        print("Percent of tuples processed : 0")
-        ################  Create the list of all subsets of i elements in n=dim_tot for all i<dimension_max+1
-        allsubsets = lambda n: list(chain(*[combinations(range(1,n), ni) for ni in range(self.dimension_max+1)]))
-        list_tuples=allsubsets(self.dimension_tot+1)
-        del list_tuples[0]
-        ################  Count the number all subsets of i elements in n=dim_tot for all i<dimension_max+1
-        if self.dimension_max != self.dimension_tot :
-            tot_numb=0
-            for  xxx in range(1,self.dimension_max+1):
-                tot_numb=tot_numb + self._binomial(self.dimension_tot,xxx)
-        counter=0
-        for tuple_var in list_tuples:
-            ################  create a counter to display the advancement of the script (this is the computationaly costly part) 
-            counter=counter+1
-            if self.dimension_max == self.dimension_tot:
-                if counter % int(pow(2, self.dimension_max) / 100) == 0:
-                    logger.info("PROGRESS: at percent #%i"  % (100*counter/pow(2,self.dimension_max)))
-            else:
-                if counter % int(tot_numb / 100) == 0:
-                    logger.info("PROGRESS: at percent #%i"  % (100*counter/tot_numb))
-            ################  create a sub-matrix of data input for all subsets of variables        
-            for x in range(0,len(tuple_var)):
-                if x==0:
-                    matrix_temp = np.reshape(data_matrix[:,tuple_var[x]-1],(data_matrix[:,tuple_var[x]-1].shape[0],1))
-                else:
-                    matrix_temp=np.concatenate((matrix_temp,np.reshape(data_matrix[:,tuple_var[x]-1],(data_matrix[:,tuple_var[x]-1].shape[0],1))),axis=1)
-            ################  compute probability and entropy for each submatrix
-            if self.deformed_probability_mode: 
-                probability =self._compute_deformed_probability(matrix_temp)
-            else:     
-                probability = self._compute_probability(matrix_temp)
-            for x,y in probability.items():
-                Nentropie[tuple_var]=Nentropie.get(tuple_var,0)+ self._information(probability[x])
-        return  Nentropie       
+        data_columns, radix = discretized_columns(data_matrix, self.dimension_tot)
+        exponent = self._deformation_exponent(data_matrix.shape[0])
+        if self.nb_of_workers > 1:
+            logger.info("computing the entropies with %i processes" % self.nb_of_workers)
+            return parallel_forward_entropies(data_columns, radix, Nentropie, self.nb_of_workers, exponent)
+        for order in range(1, self.dimension_max+1):
+            Nentropie.values_at(order)[:] = order_entropies(data_columns, radix, order, exponent=exponent)
+            logger.info("PROGRESS: order %i done (%i tuples)" % (order, Nentropie.values_at(order).shape[0]))
+        return  Nentropie
 
 
 
@@ -551,13 +1021,120 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
         if self.forward_computation_mode:
             Nentropie = self._compute_forward_entropies(data_matrix)
         else:
-            if self.deformed_probability_mode: 
-                probability =self._compute_deformed_probability(data_matrix)
-            else:     
-                probability = self._compute_probability(data_matrix)
-            Nentropie = self._compute_entropy(probability)     
+            data_columns, radix = discretized_columns(data_matrix, self.dimension_tot)
+            Nentropie = lattice_entropies(data_columns, radix, EntropyLattice(self.dimension_tot, self.dimension_max), 
+                                          self._deformation_exponent(data_matrix.shape[0]))
         return Nentropie    
 
+##############################################################################
+## MULTI-RESOLUTION SWEEP: entropies for several nb_of_values at once
+##############################################################################
+    """
+The data are discretized at each alphabet size b by _resample_matrix, so that every resolution is exactly the one
+of a separate run with nb_of_values = b (the discretization is linear in the data, the costly part is the lattice).
+In forward mode the subsets are enumerated once and counted at every resolution (see sweep_order_entropies).
+Returns a dictionary nb_of_values -> (Nentropie, Ninfomut), both EntropyLattice.
+    """
+
+    def simplicial_entropies_sweep(self, data_matrix, nb_of_values_list) :
+        self._validate_parameters()
+        if self.deformed_probability_mode:
+            raise ValueError("the multi-resolution sweep only supports deformed_probability_mode False")
+        if min(nb_of_values_list) < 2 :
+            raise ValueError("nb_of_values must be greater than 1")
+        data_columns_list = []
+        radices = []
+        for nb_of_values in nb_of_values_list:
+            data_columns, radix = discretized_columns(self._resample_matrix(data_matrix, nb_of_values), self.dimension_tot)
+            data_columns_list.append(data_columns)
+            radices.append(radix)
+        lattices = [EntropyLattice(self.dimension_tot, self.dimension_max) for _ in nb_of_values_list]
+        if self.forward_computation_mode:
+            for order in range(1, self.dimension_max+1):
+                for Nentropie, entropies in zip(lattices, sweep_order_entropies(data_columns_list, radices, order)):
+                    Nentropie.values_at(order)[:] = entropies
+        else:
+            for Nentropie, data_columns, radix in zip(lattices, data_columns_list, radices):
+                lattice_entropies(data_columns, radix, Nentropie)
+        return {nb_of_values : (Nentropie, mobius_inversion(Nentropie)) for nb_of_values, Nentropie in zip(nb_of_values_list, lattices)}
+
+##############################################################################
+## SAMPLE SIZE CONVERGENCE: entropies on the first n points for several n
+##############################################################################
+    """
+Adds the sample points one by one (in the order of the rows) and records the entropies and interaction informations
+of all the subsets up to dimension_max at each sample size of checkpoints (see convergence_order_entropies).
+At each checkpoint n the undersampled k-tuples are counted as in entropy_simplicial_lanscape: a tuple is 
+undersampled when Hk >= log2(n) - delta, delta being the histogram bin width of all the entropies at n.
+Returns:
+convergence : dictionary n -> (Nentropie, Ninfomut), both EntropyLattice
+undersampling_percent : (len(checkpoints), dimension_max) array, percent of undersampled tuples per order
+undersampling_dim : array of the undersampling dimension Ku at each checkpoint (p_value_undersampling)
+    """
+
+    def entropy_convergence(self, data_matrix, checkpoints) :
+        self._validate_parameters()
+        if self.deformed_probability_mode:
+            raise ValueError("the sample size convergence only supports deformed_probability_mode False")
+        data_matrix = self._resample_matrix(data_matrix)
+        checkpoints = sorted(set(int(n) for n in checkpoints))
+        if checkpoints[0] < 1 or checkpoints[-1] > data_matrix.shape[0]:
+            raise ValueError("checkpoints must be in between 1 and the number of points")
+        data_columns, radix = discretized_columns(data_matrix, self.dimension_tot)
+        lattices = [EntropyLattice(self.dimension_tot, self.dimension_max) for _ in checkpoints]
+        for order in range(1, self.dimension_max+1):
+            entropies = convergence_order_entropies(data_columns, radix, order, checkpoints)
+            for Nentropie, values in zip(lattices, entropies):
+                Nentropie.values_at(order)[:] = values
+        undersampling_percent = np.zeros((len(checkpoints), self.dimension_max))
+        undersampling_dim = np.full(len(checkpoints), self.dimension_max)
+        for i, (nb_points, Nentropie) in enumerate(zip(checkpoints, lattices)):
+            maxima_tot = max(Nentropie.values_at(order).max() for order in range(1, self.dimension_max+1))
+            minima_tot = min(Nentropie.values_at(order).min() for order in range(1, self.dimension_max+1))
+            delta_entropy_histo = (maxima_tot-minima_tot)/self.nb_bins_histo
+            for order in range(1, self.dimension_max+1):
+                undersampled = Nentropie.values_at(order) >= math.log2(nb_points) - delta_entropy_histo
+                undersampling_percent[i, order-1] = 100*np.mean(undersampled)
+            above = np.flatnonzero(undersampling_percent[i] > self.p_value_undersampling*100)
+            if above.shape[0] > 0:
+                undersampling_dim[i] = above[0] + 1
+        convergence = {nb_points : (Nentropie, mobius_inversion(Nentropie)) for nb_points, Nentropie in zip(checkpoints, lattices)}
+        return convergence, undersampling_percent, undersampling_dim
+
+##############################################################################
+## SHUFFLE SIGNIFICANCE: null distributions of Ik and Gk per tuple
+##############################################################################
+    """
+Each column of the discretized matrix is independently permuted nb_of_shuffle times (pethel et hah 2014): 
+the marginals are preserved but the dependencies are destroyed. The entropies of all the shuffles are computed 
+together by shuffled_order_entropies; the entropies of the single variables do not change under shuffling
+and are taken from the data. For every tuple, the p_value and 1-p_value quantiles of the shuffled interaction 
+information and total correlation give the low and high significance bounds (as in mutual_info_simplicial_lanscape).
+Returns infomut_low, infomut_high, total_corr_low, total_corr_high, all EntropyLattice.
+    """
+
+    def shuffle_significance(self, data_matrix, seed=None) :
+        self._validate_parameters()
+        if self.deformed_probability_mode:
+            raise ValueError("the shuffle significance only supports deformed_probability_mode False")
+        if self.nb_of_shuffle < 1 :
+            raise ValueError("compute_shuffle must be True and nb_of_shuffle greater than 0")
+        rng = np.random.default_rng(seed)
+        data_matrix = self._resample_matrix(data_matrix)
+        data_columns, radix = discretized_columns(data_matrix, self.dimension_tot)
+        shuffled_columns = rng.permuted(np.broadcast_to(data_columns, (self.nb_of_shuffle,) + data_columns.shape), axis=2)
+        # one (nb_of_shuffle, C(N, order)) array of entropies per order, the marginals are shared by all the shuffles
+        shuffled_entropies = {1: order_entropies(data_columns, radix, 1)[None]}
+        bounds = [EntropyLattice(self.dimension_tot, self.dimension_max) for _ in range(4)]
+        infomut_low, infomut_high, total_corr_low, total_corr_high = bounds
+        for order in range(1, self.dimension_max+1):
+            if order > 1:
+                shuffled_entropies[order] = shuffled_order_entropies(shuffled_columns, radix, order)
+            (infomut_low.values_at(order)[:], infomut_high.values_at(order)[:]), \
+            (total_corr_low.values_at(order)[:], total_corr_high.values_at(order)[:]) = \
+                shuffled_information_quantiles(shuffled_entropies, self.dimension_tot, order, [self.p_value, 1-self.p_value])
+        return tuple(bounds)
+
    
 
 ##############################################################################
@@ -566,6 +1143,8 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
 
 
     def simplicial_infomut_decomposition(self, Nentropie_input):
+        if isinstance(Nentropie_input, EntropyLattice):
+            return mobius_inversion(Nentropie_input)
         Ninfomut={}
         for x,y in Nentropie_input.items():
             for k in range(1, len(x)+1):
@@ -840,6 +1419,9 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
     They are given by chain rules and correspond to each edges of the lattice. 
     the output is a list of dictionaries dico_input_CONDtot[i-1] items are of the forms ((5, 7, 9), 0.3528757654347521)  for 
     the information of 5,7 knowing 9, e.g. I(5,7|9)
+    When dico_input is an EntropyLattice the output is the list of dense arrays of conditional_infomut: dico_input_CONDtot[i-1]
+    is a (C(N, i), i) array whose row r and column p hold the information of the i-tuple of rank r without its p-th variable,
+    knowing this variable.
     """
 
     def conditional_info_simplicial_lanscape(self, dico_input):
@@ -862,24 +1444,31 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
                 dico={} 
                 dico_input_COND[i-1].append(dico)
 
-        for i in range(1,self.dimension_max+1):
-            for x,y in dico_input.items():
-                if len(x)>1: 
-                    for b in x:
-                        if (b==i):
-                            xbis= tuple(a for a in x if (a!=i)) 
-                            cond= dico_input[xbis]-y
-                            if cond>maxima_tot:
-                                maxima_tot=cond
-                            if cond<minima_tot:
-                               minima_tot=cond 
-     # for conditioning per degree                       
-                            ListInfomutcond[len(x)-1].append(cond)                  
-     # for conditioning per variable                    
-                            dico_input_COND[len(x)-1][i-1][xbis]=cond
-                            xter = xbis + ((i),)
-                            dico_input_CONDtot[len(x)-1][xter]=cond
-     # The last term in the tuple is the conditionning variable                    
+        if isinstance(dico_input, EntropyLattice):
+            dico_input_CONDtot = conditional_infomut(dico_input)
+            for i in range(1,self.dimension_max):
+                ListInfomutcond[i] = dico_input_CONDtot[i].ravel()
+            maxima_tot = max(np.nanmax(dico_input_CONDtot[i]) for i in range(1,self.dimension_max))
+            minima_tot = min(np.nanmin(dico_input_CONDtot[i]) for i in range(1,self.dimension_max))
+        else:
+            for i in range(1,self.dimension_max+1):
+                for x,y in dico_input.items():
+                    if len(x)>1: 
+                        for b in x:
+                            if (b==i):
+                                xbis= tuple(a for a in x if (a!=i)) 
+                                cond= dico_input[xbis]-y
+                                if cond>maxima_tot:
+                                    maxima_tot=cond
+                                if cond<minima_tot:
+                                   minima_tot=cond 
+         # for conditioning per degree                       
+                                ListInfomutcond[len(x)-1].append(cond)                  
+         # for conditioning per variable                    
+                                dico_input_COND[len(x)-1][i-1][xbis]=cond
+                                xter = xbis + ((i),)
+                                dico_input_CONDtot[len(x)-1][xter]=cond
+         # The last term in the tuple is the conditionning variable                    
         for a in range(1,self.dimension_max+1):
             # if self.dimension_max<9 :
             #     #plt.subplot(3,3,a)
@@ -891,9 +1480,9 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
             #             #plt.subplot(5,4,a) 
             #         else :
             #             #plt.subplot(5,5,a)
-            ListInfomutcond[a].append(minima_tot-0.1)
-            ListInfomutcond[a].append(maxima_tot+0.1)           
+            ListInfomutcond[a] = np.append(ListInfomutcond[a], [minima_tot-0.1, maxima_tot+0.1])
             #n, bins, patches = #plt.hist(ListInfomutcond[a], self.nb_bins_histo, facecolor='r')
+            n, bins = np.histogram(ListInfomutcond[a], self.nb_bins_histo)
             #plt.title(str('condInfo'+str(a)+' dist'))
             #plt.axis([minima_tot, maxima_tot,0,n.max()])
             #plt.grid(True)
@@ -1008,17 +1597,24 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
         for i in range(1,self.dimension_max+1):
             list_tot_correlation[i]=[]
 
-        for x,y in Nentropie.items():
-            sum_marginals = 0
-            for var in x:
-                sum_marginals = sum_marginals + Nentropie[(var,)]
-            total_corr =   sum_marginals - y 
-            Ntotal_correlation.update( {x : total_corr} )
-            list_tot_correlation[len(x)].append(total_corr)
-            if total_corr>maxima_tot:
-                maxima_tot=total_corr
-            if total_corr<minima_tot:
-                minima_tot=total_corr  
+        if isinstance(Nentropie, EntropyLattice):
+            Ntotal_correlation = total_correlations(Nentropie)
+            for i in range(1,self.dimension_max+1):
+                list_tot_correlation[i]=Ntotal_correlation.values_at(i)
+            maxima_tot=max(np.nanmax(values) for values in list_tot_correlation.values())
+            minima_tot=min(np.nanmin(values) for values in list_tot_correlation.values())
+        else:
+            for x,y in Nentropie.items():
+                sum_marginals = 0
+                for var in x:
+                    sum_marginals = sum_marginals + Nentropie[(var,)]
+                total_corr =   sum_marginals - y 
+                Ntotal_correlation.update( {x : total_corr} )
+                list_tot_correlation[len(x)].append(total_corr)
+                if total_corr>maxima_tot:
+                    maxima_tot=total_corr
+                if total_corr<minima_tot:
+                    minima_tot=total_corr  
   
         for a in range(1,self.dimension_max+1):
             # if self.dimension_max<=9 :
@@ -1031,8 +1627,7 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
             #             #plt.subplot(5,4,a)
             #         else :
             #             #plt.subplot(5,5,a)          
-            list_tot_correlation[a].append(minima_tot-0.1)
-            list_tot_correlation[a].append(maxima_tot+0.1)
+            list_tot_correlation[a] = np.append(list_tot_correlation[a], [minima_tot-0.1, maxima_tot+0.1])
             #n, bins, patches = plt.hist(list_tot_correlation[a], self.nb_bins_histo, facecolor='b')
             #plt.clf()
             #plt.axis([minima_tot, maxima_tot,0,n.max()])
@@ -1079,15 +1674,22 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
         for i in range(1,self.dimension_max+1):
             list_info_volume[i]=[]
 
-        for x,y in Nentropie.items():
-            sum_marginals = 0               
-            info_vol =  y - Ninfomut[x]
-            Ninfo_volume.update( {x : info_vol} )
-            list_info_volume[len(x)].append(info_vol)
-            if info_vol>maxima_tot:
-                maxima_tot=info_vol
-            if info_vol<minima_tot:
-                minima_tot=info_vol  
+        if isinstance(Nentropie, EntropyLattice):
+            Ninfo_volume = information_volumes(Nentropie, Ninfomut)
+            for i in range(1,self.dimension_max+1):
+                list_info_volume[i]=Ninfo_volume.values_at(i)
+            maxima_tot=max(np.nanmax(values) for values in list_info_volume.values())
+            minima_tot=min(np.nanmin(values) for values in list_info_volume.values())
+        else:
+            for x,y in Nentropie.items():
+                sum_marginals = 0               
+                info_vol =  y - Ninfomut[x]
+                Ninfo_volume.update( {x : info_vol} )
+                list_info_volume[len(x)].append(info_vol)
+                if info_vol>maxima_tot:
+                    maxima_tot=info_vol
+                if info_vol<minima_tot:
+                    minima_tot=info_vol  
   
         for a in range(1,self.dimension_max+1):
             # if self.dimension_max<=9 :
@@ -1100,9 +1702,9 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
             #             #plt.subplot(5,4,a)
             #         else :
             #             #plt.subplot(5,5,a)          
-            list_info_volume[a].append(minima_tot-0.1)
-            list_info_volume[a].append(maxima_tot+0.1)
+            list_info_volume[a] = np.append(list_info_volume[a], [minima_tot-0.1, maxima_tot+0.1])
             #n, bins, patches = #plt.hist(list_info_volume[a], self.nb_bins_histo, facecolor='b')
+            n, bins = np.histogram(list_info_volume[a], self.nb_bins_histo)
             #plt.axis([minima_tot, maxima_tot,0,n.max()])
             #plt.title(str('V'+str(a)+' dist'))
             if a==1 :
@@ -1137,7 +1739,17 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
     def display_higher_lower_cond_information(self, dico_input_CONDtot): 
         
         print('The conditional information at dim',(self.dim_to_rank-1))
-        print(OrderedDict(sorted(dico_input_CONDtot[self.dim_to_rank-1].items(), key=lambda t: t[1])))
+        cond = dico_input_CONDtot[self.dim_to_rank-1]
+        if isinstance(cond, np.ndarray):
+            # dense array of conditional_infomut: rebuild the (xbis..., conditioning variable) keys in increasing order
+            order = np.argsort(cond, axis=None)
+            rows, positions = np.unravel_index(order, cond.shape)
+            tuples = (nplet_block(self.dimension_tot, self.dim_to_rank, 0, cond.shape[0]) + 1).tolist()
+            keys = [tuple(x for p, x in enumerate(tuples[row]) if p != position) + (tuples[row][position],) 
+                    for row, position in zip(rows.tolist(), positions.tolist())]
+            print(OrderedDict(zip(keys, cond.ravel()[order].tolist())))
+        else:
+            print(OrderedDict(sorted(dico_input_CONDtot[self.dim_to_rank-1].items(), key=lambda t: t[1])))
      
 ###############################################################
 ########          Ring representation               ##########
@@ -1150,6 +1762,13 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
     """
 
     def mutual_info_pairwise_network(self, Ninfomut) :       
+        if isinstance(Ninfomut, EntropyLattice):
+            adjacency_matrix = pairwise_information_matrix(Ninfomut)
+            if not server:
+                netring = nx.relabel_nodes(nx.from_numpy_array(np.triu(adjacency_matrix, 1)), lambda x: x+1)
+                nx.draw_circular(netring, with_labels= True, node_size = (np.diag(adjacency_matrix)**2) *500,
+                                 width= [netring[u][v]['weight']*10 for u,v in netring.edges()])
+            return adjacency_matrix
         infomut_per_order=[]      
         for x in range(self.dimension_max+1):
             info_dicoperoder={} 
@@ -1181,7 +1800,8 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
             netring.add_edge(var_1, var_2, weight= (infomut_per_order[2][x]) )
             list_of_width.append((infomut_per_order[2][x]*10))
         #plt.subplot(1, 2, 1)    
-        nx.draw_circular(netring, with_labels= True, nodelist = list_of_node,edgelist = list_of_edge, width= list_of_width, node_size = list_of_size)
+        if not server:
+            nx.draw_circular(netring, with_labels= True, nodelist = list_of_node,edgelist = list_of_edge, width= list_of_width, node_size = list_of_size)
         adjacency_matrix = np.zeros((len(list_of_node), len(list_of_node)))
         for x,y in infomut_per_order[2].items():
             adjacency_matrix[x[0]-1,x[1]-1] = y
@@ -1196,6 +1816,23 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
         #plt.show()
         return adjacency_matrix
 
+    """
+    Plot-free pairwise network: the N x N matrix of I2 with I1 on the diagonal (see pairwise_information_matrix), and if
+    top_k is given also the sparse network of the top_k strongest pairwise informations of each node (see top_k_pairwise).
+    """
+
+    def pairwise_information_network(self, Ninfomut, top_k=None) :
+        if not isinstance(Ninfomut, EntropyLattice):
+            lattice = EntropyLattice(self.dimension_tot, 2)
+            for x,y in Ninfomut.items():
+                if len(x) <= 2:
+                    lattice[x] = y
+            Ninfomut = lattice
+        adjacency_matrix = pairwise_information_matrix(Ninfomut)
+        if top_k is None:
+            return adjacency_matrix
+        return adjacency_matrix, top_k_pairwise(adjacency_matrix, top_k)
+
 
 
 # ########################################################################################
@@ -1777,50 +2414,72 @@ https://stackoverflow.com/questions/101439/the-most-efficient-way-to-implement-a
     '''          
 
 
-    def information_paths( self, Ninfomut):
-        # construct a vector of marginal variable   
-        variable_vector =np.arange(self.dimension_tot)+1
-        # construct the set of all paths with n=dimension_tot variables...  For examples if  dimension_tot= 4  then list_paths has 24 elements (the permutations of [1..4]):
-        # [(1, 2, 3, 4), (1, 2, 4, 3), (1, 3, 2, 4), (1, 3, 4, 2), (1, 4, 2, 3), (1, 4, 3, 2), (2, 1, 3, 4), (2, 1, 4, 3), (2, 3, 1, 4), (2, 3, 4, 1), (2, 4, 1, 3), (2, 4, 3, 1), (3,1, 2, 4), (3, 1, 4, 2), (3, 2, 1, 4), (3, 2, 4, 1), (3, 4, 1, 2), (3, 4, 2, 1), (4, 1, 2, 3), (4, 1, 3, 2), (4, 2, 1, 3), (4, 2, 3, 1), (4, 3, 1, 2), (4, 3, 2, 1)]    
-        list_paths = list(itertools.permutations(variable_vector,self.dimension_tot))
-        list_maximal_chain = []
-        for path in list_paths :
-            list_elements=[]
-            # explore a path from the first element by adding elements in the order of the path
-            for elements in path :
-                list_elements.append(elements)
-                if len(list_elements) == 1:
-                    infomut_element_old = Ninfomut[tuple(sorted(list_elements))]
-                infomut_element_new= Ninfomut[tuple(sorted(list_elements))]                
-                # stops the exploration if mutual information increases and save the path if not already saved
-                if ((infomut_element_new > infomut_element_old) and (len(list_elements) >1)) or (len(list_elements) == self.dimension_tot) :             
-                    if (len(list_elements) < self.dimension_tot):
-                        maximal_chain = list_elements[:-1] 
-                    else: 
-                        maximal_chain = list_elements
-                    maximal_chain = sorted(maximal_chain) 
-                    if maximal_chain not in list_maximal_chain:
-                        list_maximal_chain.append(maximal_chain)                        
-                    list_maximal_chain.append(maximal_chain)
-                    break
-                else :
-                    infomut_element_old = infomut_element_new   
-        # there are still some spurious inclusions to remove    (some chains are included into other)  
-        print(list_maximal_chain)      
-        final_list_maximal_chain = copy.deepcopy(list_maximal_chain) 
-        for maximal_chains in list_maximal_chain : 
-            for maximal_chains_test in list_maximal_chain :
-                maximal_set_test = set(maximal_chains_test)
-                maximal_set = set(maximal_chains)
-                if maximal_chains != maximal_chains_test  :      
-                    if maximal_set_test.issubset(maximal_set): 
-                        if maximal_chains_test in final_list_maximal_chain:
-                            final_list_maximal_chain.remove(maximal_chains_test)
-                    if maximal_set.issubset(maximal_set_test): 
-                        if maximal_chains in final_list_maximal_chain:
-                            final_list_maximal_chain.remove(maximal_chains)     
-
-        return  final_list_maximal_chain            
+    '''
+    Instead of enumerating the dimension_tot! permutations, the paths are explored level by level on the sets of variables:
+    a k-tuple S is reached by a positive path if one of its (k-1)-faces S' is reached and I(S) <= I(S'), and a path ends at S 
+    (S is recorded) when one extension S+v increases the information, or when S contains all the variables. This gives the 
+    maximal chains of the permutation enumeration, except that a path whose last variable increases the information now ends 
+    before it, as at the other steps (the enumeration recorded the whole set in that case). 
+    With beam_width = None the search is exact and keeps every reached tuple of a level: on data with many positive paths 
+    this is up to C(dimension_tot, k) tuples at level k, combinatorial on whole-brain atlases. With beam_width, only the 
+    beam_width reached tuples of lowest information are kept at each level (beam search, approximate but tractable on 
+    whole-brain atlases: at most beam_width*dimension_tot extensions per level).
+    The interaction informations are read from Ninfomut and, beyond it, evaluated lazily from data_matrix (see InfomutCache);
+    without data_matrix a path that goes beyond the dimension_max of Ninfomut raises a ValueError.
+    Chains included in another chain are removed with a posting-list index (variable -> chains containing it).
+    '''
+
+    def information_paths( self, Ninfomut, data_matrix=None, beam_width=None):
+        if data_matrix is not None:
+            data_columns, radix = discretized_columns(self._resample_matrix(data_matrix), self.dimension_tot)
+            infomut_cache = InfomutCache(self.dimension_tot, data_columns, radix, Ninfomut=Ninfomut)
+        else:
+            infomut_cache = InfomutCache(self.dimension_tot, Ninfomut=Ninfomut)
+        list_maximal_chain = set()
+        level = {(var,) : infomut_cache.infomut((var,)) for var in range(1, self.dimension_tot+1)}
+        while level:
+            next_level = {}
+            for tuple_var, infomut_value in level.items():
+                if len(tuple_var) == self.dimension_tot:
+                    list_maximal_chain.add(tuple_var)
+                    continue
+                candidates, values = infomut_cache.extensions(tuple_var)
+                if np.any(values > infomut_value):
+                    list_maximal_chain.add(tuple_var)
+                for var, value in zip(candidates, values.tolist()):
+                    if value <= infomut_value:
+                        next_level[tuple(sorted(tuple_var + (var,)))] = value
+            if beam_width is not None and len(next_level) > beam_width:
+                next_level = dict(heapq.nsmallest(beam_width, next_level.items(), key=itemgetter(1)))
+            level = next_level
+        # remove the chains included into another chain: the chains containing all the variables of a chain
+        # are the intersection of the posting lists of its variables
+        postings = {}
+        for chain_id, maximal_chain in enumerate(list_maximal_chain):
+            for var in maximal_chain:
+                postings.setdefault(var, set()).add(chain_id)
+        final_list_maximal_chain = []
+        for chain_id, maximal_chain in enumerate(list_maximal_chain):
+            supersets = set.intersection(*(postings[var] for var in maximal_chain))
+            if len(supersets) == 1:
+                final_list_maximal_chain.append(list(maximal_chain))
+        return  sorted(final_list_maximal_chain)
+
+    '''
+    Greedy search of a k-tuple of maximal information: starts from the pair of maximal mutual information and adds at 
+    each step the variable that maximizes the interaction information, up to dimension_max variables (self.dimension_max 
+    by default). Only the entropies of the subsets that are needed are computed, one batched histogram call per step 
+    (see greedy_information_growth); passing the same infomut_cache to several calls shares the memoized entropies.
+    Returns the list of (tuple, information) along the path.
+    '''
+
+    def greedy_information_tuple( self, data_matrix, dimension_max=None, infomut_cache=None):
+        if infomut_cache is None:
+            data_columns, radix = discretized_columns(self._resample_matrix(data_matrix), self.dimension_tot)
+            infomut_cache = InfomutCache(self.dimension_tot, data_columns, radix)
+        if dimension_max is None:
+            dimension_max = self.dimension_max
+        return greedy_information_growth(infomut_cache, dimension_max)
 
 
 # #########################################################################
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Combinatorial number system (combinadic) index for n-plets.
+
+The n-plets (i_1 < i_2 < ... < i_n) of range(N) are ranked in the lexicographic order of
+itertools.combinations, so the rank of an n-plet is also its row in the full outputs of
+high_order and run_High_Order. Storing a single int64 rank (or a compact uint16 (M, n) array)
+instead of stringified tuples lets any n-plet be looked up or joined by integer position.
+"""
+
+import numpy as np
+from scipy.special import comb
+
+
+def nplet_count(N, n):
+
+    """
+    Number of n-plets among N variables, C(N, n).
+    """
+
+    return int(comb(N, n, exact = True))
+
+
+def compact_dtype(N):
+
+    """
+    Smallest unsigned integer dtype able to hold the indexes of N variables.
+    """
+
+    return np.min_scalar_type(max(N - 1, 0))
+
+
+def _binomial_table(N, n):
+
+    """
+    table[k, d] = C(d, k) for k in [0, n] and d in [0, N].
+    """
+
+    table = np.zeros((n + 1, N + 1), dtype = np.int64)
+    table[0] = 1
+    for k in range(1, n + 1):
+        table[k, 1:] = np.cumsum(table[k - 1, :-1]) # C(d, k) = sum_{m < d} C(m, k-1), exact in int64
+    return table
+
+
+def rank_nplets(nplets, N):
+
+    """
+
+    INPUTS :
+
+    nplets = M x n array of sorted n-plets (0-based indexes).
+    N = number of variables.
+
+    OUTPUTS :
+
+    ranks = int64 array of length M with the lexicographic rank of each n-plet.
+
+    """
+
+    nplets = np.atleast_2d(np.asarray(nplets, dtype = np.int64))
+    M, n = nplets.shape
+    table = _binomial_table(N, n)
+
+    # lexicographic rank = C(N, n) - 1 - colexicographic rank of the complemented indexes N-1-i
+    ranks = np.full(M, nplet_count(N, n) - 1, dtype = np.int64)
+    for position in range(n):
+        ranks -= table[n - position, N - 1 - nplets[:, position]]
+    return ranks
+
+
+def unrank_nplets(ranks, N, n, dtype = np.int64):
+
+    """
+
+    INPUTS :
+
+    ranks = array of lexicographic ranks in [0, C(N, n)).
+    N = number of variables.
+    n = order of the n-plets.
+    dtype = integer dtype of the output (e.g. compact_dtype(N)).
+
+    OUTPUTS :
+
+    nplets = (len(ranks), n) array with the sorted n-plets (0-based indexes).
+
+    """
+
+    ranks = np.asarray(ranks, dtype = np.int64)
+    table = _binomial_table(N, n)
+    remaining = nplet_count(N, n) - 1 - ranks
+    nplets = np.empty(ranks.shape + (n,), dtype = dtype)
+
+    for position in range(n):
+        k = n - position
+        # largest d with C(d, k) <= remaining, found for all the ranks at once
+        d = np.searchsorted(table[k, :N], remaining, side = 'right') - 1
+        remaining = remaining - table[k, d]
+        nplets[..., position] = N - 1 - d
+    return nplets
+
+
+def nplet_block(N, n, start, stop, dtype = np.int64):
+
+    """
+    N-plets with ranks in [start, stop), as a (stop - start, n) array.
+    """
+
+    return unrank_nplets(np.arange(start, stop, dtype = np.int64), N, n, dtype = dtype)
+
+
+def parse_nplets(column):
+
+    """
+    Converts a column of stringified n-plets, e.g. '(0, 1, 2)' or '[1, 2, 3]', into an (M, n) integer array.
+    Only used to read files written before the rank index existed.
+    """
+
+    return np.array(column.astype(str).str.findall(r'\d+').tolist(), dtype = np.int64)
@@ -1,9 +1,15 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 import ast
 import networkx as nx
 from scipy.stats import zscore
 
+# The n-plet rank index is shared with CodeBlock1
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CodeBlock1'))
+from nplet_index import nplet_count, parse_nplets, unrank_nplets
+
 
 # This code performs an analysis of hypergraphs constructed from high-order interdependencies (HOI) data,
 # focusing on computing various centrality measures and comparing them to a random baseline. 
@@ -32,8 +38,10 @@ import random
 
 fraction=0.005
 max_workers=10
+n_regions=92
 
-def create_hypergraph(dataframe, sort_column='Mut Info_normalized', mode='redundancy', random_selection=False):
+def create_hypergraph(dataframe, sort_column='Mut Info_normalized', mode='redundancy', random_selection=False,
+                      n_regions=n_regions, order=3):
     # If random selection is enabled, select all triplets randomly
     if random_selection:
         shuffled_df = dataframe.sample(frac=1).reset_index(drop=True)
@@ -52,21 +60,24 @@ def create_hypergraph(dataframe, sort_column='Mut Info_normalized', mode='redund
     # Select the top percentage of the DataFrame
     top_df = shuffled_df.head(num_rows).copy()
 
-    # Parse the 'nplets' column
-    top_df['nplets'] = top_df['nplets'].apply(ast.literal_eval)
-
-    # Number of triplets
-    n = len(top_df['nplets'])
+    # Get the triplets as an integer array: from the rank column when available, otherwise
+    # by parsing the stringified 'nplets' column of older files
+    # (the ranks are only meaningful for the atlas size n_regions and the n-plet order they were computed with)
+    if 'rank' in top_df.columns:
+        ranks = top_df['rank'].to_numpy()
+        if len(ranks) and (ranks.min() < 0 or ranks.max() >= nplet_count(n_regions, order)):
+            raise ValueError("rank out of range for %i-plets of %i regions, check n_regions and order" % (order, n_regions))
+        nplets = unrank_nplets(ranks, n_regions, order)
+    else:
+        nplets = parse_nplets(top_df['nplets'])
+    top_df['nplets'] = list(map(tuple, nplets.tolist()))
 
-    # Initialize the adjacency matrix
-    H = np.zeros((n, n), dtype=int)
+    # Region membership of each triplet
+    membership = np.zeros((len(nplets), nplets.max() + 1 if len(nplets) else 0), dtype=int)
+    np.put_along_axis(membership, nplets, 1, axis=1)
 
-    # Populate the adjacency matrix
-    for i in range(n):
-        for j in range(i + 1, n):
-            if len(set(top_df['nplets'].iloc[i]).intersection(set(top_df['nplets'].iloc[j]))) == 2:
-                H[i, j] = 1
-                H[j, i] = 1  # Matrix is symmetric
+    # Two triplets are linked when they share exactly two regions (the matrix is symmetric)
+    H = (membership @ membership.T == 2).astype(int)
 
     return top_df, H
 